@@ -84,6 +84,14 @@ MIDDLEWARE = [
 ]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media' 
+
+# How /media/ bytes leave the server (foodapp.media): "django" streams them
+# from the worker; "x-accel" (nginx) or "x-sendfile" (Apache, lighttpd) hand
+# the file to the web server. For nginx, map MEDIA_ACCEL_PREFIX onto
+# MEDIA_ROOT in an `internal` location.
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -137,6 +145,72 @@ else:
 
 
 
+# Cache
+# Local memory by default. Set CACHE_BACKEND/CACHE_LOCATION to a shared cache
+# (e.g. database or redis) when running more than one web process, otherwise
+# menu version bumps only reach the process that made the change.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'quickbite'),
+    }
+}
+if CACHES['default']['BACKEND'].endswith(('LocMemCache', 'FileBasedCache', 'DatabaseCache')):
+    # One row version and one fragment per food and order: the default of
+    # 300 entries would evict them (and the version counters) constantly.
+    # Other backends take their size from the server.
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 50000))}
+
+# Rendered menu lists are keyed by menu version, so this only bounds memory.
+MENU_CACHE_TIMEOUT = int(os.environ.get('MENU_CACHE_TIMEOUT', 60 * 60))
+
+# Render large read-only lists (foods, orders) from values() rows instead of
+# per-row serializers. Output is identical; see foodapp/fastlist.py.
+API_FAST_LISTS = env_bool('API_FAST_LISTS', False)
+
+# Build food/order lists from cached per-row fragments, re-serializing only
+# rows that changed; see foodapp/fragments.py.
+API_FRAGMENT_CACHE = env_bool('API_FRAGMENT_CACHE', True)
+
+# Upper bounds (Tzs) of the price buckets returned by /api/foods/facets/
+MENU_PRICE_BUCKETS = [2000, 5000, 10000, 20000]
+
+# Most suggestions /api/foods/suggest/ can return per prefix
+MENU_SUGGEST_LIMIT = 20
+
+# Food photo variants (foodapp.images): built on a thread pool after the
+# upload commits. Turn async off to build them inline (tests, scripts).
+FOOD_IMAGE_WORKERS = int(os.getenv('FOOD_IMAGE_WORKERS', 2))
+FOOD_IMAGE_VARIANTS_ASYNC = env_bool('FOOD_IMAGE_VARIANTS_ASYNC', True)
+
+# Photo uploads (foodapp.uploads) stream to the staging directory, outside
+# MEDIA_ROOT, and are decoded, stripped of EXIF and downscaled to
+# FOOD_IMAGE_MAX_EDGE by a pool of FOOD_UPLOAD_PROCESSES processes.
+FOOD_IMAGE_MAX_UPLOAD_BYTES = int(os.getenv('FOOD_IMAGE_MAX_UPLOAD_BYTES', 15 * 1024 * 1024))
+FOOD_IMAGE_MAX_EDGE = 2048
+FOOD_IMAGE_MAX_PIXELS = 40_000_000
+FOOD_UPLOAD_STAGING_DIR = os.getenv('FOOD_UPLOAD_STAGING_DIR', str(BASE_DIR / 'media_staging'))
+FOOD_UPLOAD_PROCESSES = int(os.getenv('FOOD_UPLOAD_PROCESSES', 2))
+
+# Where Food images are stored (foodapp.storage): "local" (MEDIA_ROOT) or
+# "s3" for any S3-compatible bucket (AWS, MinIO, R2), which lets several web
+# processes share them. The bucket should be public-read for foods/ only;
+# incoming/ holds unchecked direct uploads.
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE', 'local')
+MEDIA_S3_BUCKET = os.getenv('MEDIA_S3_BUCKET', '')
+MEDIA_S3_ENDPOINT_URL = os.getenv('MEDIA_S3_ENDPOINT_URL') or None
+MEDIA_S3_REGION = os.getenv('MEDIA_S3_REGION') or None
+MEDIA_S3_PUBLIC_URL = os.getenv('MEDIA_S3_PUBLIC_URL', '')
+MEDIA_S3_ACCESS_KEY_ID = os.getenv('MEDIA_S3_ACCESS_KEY_ID') or None
+MEDIA_S3_SECRET_ACCESS_KEY = os.getenv('MEDIA_S3_SECRET_ACCESS_KEY') or None
+
+# Lifetime in seconds of presigned direct-to-storage uploads
+DIRECT_UPLOAD_EXPIRES = 15 * 60
+
+# How many "frequently ordered together" dishes to keep per dish
+RELATED_FOODS_TOP_K = 10
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -210,9 +284,31 @@ if not DEBUG:
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'foodapp.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'foodapp.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
+# JSON backend for the API renderer/parser: "auto" (orjson when installed),
+# "orjson" or "stdlib"
+API_JSON_BACKEND = os.environ.get('API_JSON_BACKEND', 'auto')
+
+# Offer application/msgpack to clients that ask for it in Accept
+try:
+    import msgpack  # noqa: F401
+except ImportError:
+    pass
+else:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] += ('foodapp.renderers.MessagePackRenderer',)
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] += ('foodapp.renderers.MessagePackParser',)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
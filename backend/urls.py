@@ -18,15 +18,14 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, re_path, include
-from django.conf import settings
-from django.conf.urls.static import static
-from django.views.static import serve
 from django.http import JsonResponse
 
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from foodapp.media import receive_direct_upload, serve_media
+
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -70,9 +69,10 @@ urlpatterns = [
 
 
 # Serve uploaded media files in both development and production.
-# Render does not provide persistent disk, but this ensures files uploaded
-# during runtime can be read back immediately by clients.
-urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Render does not provide persistent disk, so with more than one web process
+# set MEDIA_STORAGE=s3: images are then served from the bucket and these
+# routes only back the local storage.
 urlpatterns += [
-    re_path(r"^media/(?P<path>.*)$", serve, {"document_root": settings.MEDIA_ROOT}),
+    re_path(r"^media/(?P<path>.*)$", serve_media),
+    path('media-upload/', receive_direct_upload, name='direct-upload'),
 ]
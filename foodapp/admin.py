@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.models import User, Group
-from .models import Profile, Food, Order, OrderItem, Inventory, Notification
+from .models import Profile, Food, Order, OrderItem, Inventory, FoodSalesRollup, RelatedFood, Notification
 
 
 # ======================
@@ -123,6 +123,54 @@ class InventoryAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('restaurant')
 
 
+# ======================
+# FOOD SALES ROLLUP ADMIN
+# ======================
+@admin.register(FoodSalesRollup)
+class FoodSalesRollupAdmin(admin.ModelAdmin):
+    list_display = ('day', 'get_food', 'quantity', 'revenue')
+    list_filter = ('day',)
+    search_fields = ('food__name',)
+    ordering = ('-day', '-quantity')
+    
+    @admin.display(description='Food', ordering='food__name')
+    def get_food(self, obj):
+        try:
+            return obj.food.name if obj.food and obj.food.name else '-'
+        except (AttributeError, Food.DoesNotExist):
+            return '-'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('food')
+
+
+# ======================
+# RELATED FOOD ADMIN
+# ======================
+@admin.register(RelatedFood)
+class RelatedFoodAdmin(admin.ModelAdmin):
+    list_display = ('get_food', 'rank', 'get_related', 'together_count')
+    search_fields = ('food__name', 'related__name')
+    ordering = ('food', 'rank')
+    
+    @admin.display(description='Food', ordering='food__name')
+    def get_food(self, obj):
+        try:
+            return obj.food.name if obj.food and obj.food.name else '-'
+        except (AttributeError, Food.DoesNotExist):
+            return '-'
+    
+    @admin.display(description='Ordered with', ordering='related__name')
+    def get_related(self, obj):
+        try:
+            return obj.related.name if obj.related and obj.related.name else '-'
+        except (AttributeError, Food.DoesNotExist):
+            return '-'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('food', 'related')
+
+
 # ======================
 # NOTIFICATION ADMIN
 # ======================
@@ -0,0 +1,266 @@
+"""
+Bulk menu import and export for restaurants.
+
+Imports are read from the request stream one line at a time (CSV with a
+header row, or NDJSON), validated with FoodSerializer in chunks, and each
+chunk is written with bulk_create / bulk_update in its own transaction.
+Rows with an "id" update that dish; rows without one create a new dish.
+
+bulk_create and bulk_update skip model signals and auto_now, so the menu
+version, the touched rows' fragment versions, updated_at and the public
+menu read model (foodapp.menu) are handled here explicitly.
+
+Exports stream the restaurant's menu in the same formats with
+QuerySet.iterator(), so neither side holds the whole menu in memory.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .cache import bump_menu_version, bump_row_version
+from .menu import refresh_menu_entries
+from .models import Food
+from .renderers import orjson, use_orjson
+from .serializers import FoodSerializer
+
+
+BULK_CHUNK_SIZE = getattr(settings, 'MENU_BULK_CHUNK_SIZE', 500)
+
+# Most items one POST /api/foods/bulk_update/ may change
+BULK_UPDATE_LIMIT = getattr(settings, 'MENU_BULK_UPDATE_LIMIT', 500)
+
+# Report at most this many bad rows; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+EXPORT_FIELDS = ['id', 'name', 'description', 'price', 'stock', 'category', 'available']
+
+CSV_TYPES = ('text/csv',)
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+class BulkFormatError(Exception):
+    pass
+
+
+# ======================
+# IMPORT
+# ======================
+def _lines(stream):
+    for line in stream:
+        yield line.decode('utf-8-sig')
+
+
+def read_csv(stream):
+    """(row number, dict) pairs; empty cells count as not given"""
+    reader = csv.DictReader(_lines(stream))
+    for number, row in enumerate(reader, start=1):
+        yield number, {key: value for key, value in row.items() if key and value not in ('', None)}
+
+
+def read_ndjson(stream):
+    loads = orjson.loads if use_orjson() else json.loads
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = loads(line)
+        except ValueError:
+            yield number, None
+            continue
+        yield number, row if isinstance(row, dict) else None
+
+
+def get_reader(content_type):
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in CSV_TYPES:
+        return read_csv
+    if media_type in NDJSON_TYPES:
+        return read_ndjson
+    raise BulkFormatError(media_type)
+
+
+class MenuImport:
+    def __init__(self, restaurant):
+        self.restaurant = restaurant
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, number, detail):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': detail})
+
+    def run(self, rows, chunk_size=BULK_CHUNK_SIZE):
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            self.write_chunk(chunk)
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+    def write_chunk(self, chunk):
+        ids = set()
+        for _, row in chunk:
+            if row is not None and 'id' in row:
+                try:
+                    ids.add(int(row['id']))
+                except (TypeError, ValueError):
+                    pass
+        existing = Food.objects.filter(restaurant=self.restaurant).in_bulk(ids)
+
+        to_create, to_update, update_fields = [], {}, set()
+        now = timezone.now()
+        for number, row in chunk:
+            if row is None:
+                self.error(number, {'non_field_errors': ['Expected a JSON object.']})
+                continue
+
+            row = dict(row)
+            food_id = row.pop('id', None)
+            if food_id is None:
+                serializer = FoodSerializer(data=row)
+            else:
+                try:
+                    food = existing.get(int(food_id))
+                except (TypeError, ValueError):
+                    food = None
+                if food is None:
+                    self.error(number, {'id': ['No dish with this id on your menu.']})
+                    continue
+                serializer = FoodSerializer(food, data=row, partial=True)
+
+            if not serializer.is_valid():
+                self.error(number, serializer.errors)
+                continue
+
+            if food_id is None:
+                to_create.append(Food(restaurant=self.restaurant, **serializer.validated_data))
+            else:
+                for name, value in serializer.validated_data.items():
+                    setattr(food, name, value)
+                    update_fields.add(name)
+                food.updated_at = now
+                to_update[food.pk] = food
+
+        with transaction.atomic():
+            if to_create:
+                Food.objects.bulk_create(to_create, batch_size=BULK_CHUNK_SIZE)
+            if to_update:
+                Food.objects.bulk_update(
+                    to_update.values(), sorted(update_fields | {'updated_at'}), batch_size=BULK_CHUNK_SIZE
+                )
+                label = Food._meta.label_lower
+                for pk in to_update:
+                    transaction.on_commit(lambda pk=pk: bump_row_version(label, pk))
+            refresh_menu_entries([food.pk for food in to_create] + list(to_update))
+            if to_create or to_update:
+                # Per chunk: a malformed line later on must not leave
+                # committed rows behind a stale menu cache
+                restaurant_id = self.restaurant.id
+                transaction.on_commit(lambda: bump_menu_version(restaurant_id))
+
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+
+def import_menu(restaurant, stream, content_type):
+    """
+    Import rows from stream, raising BulkFormatError for content types
+    other than CSV and NDJSON. Chunks written before a malformed line (bad
+    encoding, broken CSV quoting) stay committed.
+    """
+    reader = get_reader(content_type)
+    return MenuImport(restaurant).run(reader(stream) if stream is not None else ())
+
+
+# ======================
+# BULK FIELD UPDATES
+# ======================
+def update_foods(restaurant, updates):
+    """
+    Apply validated partial updates ({'id': ..., 'price': ...}) to the
+    restaurant's dishes in a single UPDATE ... CASE WHEN statement.
+
+    Returns the ids that aren't on the restaurant's menu; if there are any,
+    nothing is changed. The menu version is bumped once, on commit.
+    """
+    ids = [update['id'] for update in updates]
+    fields = {}
+    for name in ('price', 'stock', 'available'):
+        whens = [
+            When(id=update['id'], then=Value(update[name]))
+            for update in updates
+            if name in update
+        ]
+        if whens:
+            model_field = Food._meta.get_field(name)
+            fields[name] = Case(*whens, default=F(name), output_field=model_field)
+    staff_set = [update['id'] for update in updates if 'available' in update]
+    if staff_set:
+        fields['sold_out'] = Case(
+            When(id__in=staff_set, then=Value(False)), default=F('sold_out'),
+            output_field=Food._meta.get_field('sold_out'),
+        )
+
+    with transaction.atomic():
+        queryset = Food.objects.filter(restaurant=restaurant, id__in=ids)
+        count = queryset.update(updated_at=timezone.now(), **fields)
+        if count != len(ids):
+            found = set(queryset.values_list('id', flat=True))
+            transaction.set_rollback(True)
+            return [food_id for food_id in ids if food_id not in found]
+        refresh_menu_entries(ids)
+
+        restaurant_id = restaurant.id
+        label = Food._meta.label_lower
+        transaction.on_commit(lambda: bump_menu_version(restaurant_id))
+        for food_id in ids:
+            transaction.on_commit(lambda food_id=food_id: bump_row_version(label, food_id))
+    return []
+
+
+# ======================
+# EXPORT
+# ======================
+class _Echo:
+    """File-like object whose write() hands back what it was given"""
+
+    def write(self, value):
+        return value
+
+
+def _export_rows(restaurant):
+    queryset = (
+        Food.objects.filter(restaurant=restaurant)
+        .order_by('id')
+        .values_list(*EXPORT_FIELDS)
+    )
+    for values in queryset.iterator(chunk_size=BULK_CHUNK_SIZE):
+        row = dict(zip(EXPORT_FIELDS, values))
+        row['price'] = str(row['price'])
+        yield row
+
+
+def export_csv(restaurant):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in _export_rows(restaurant):
+        yield writer.writerow([row[name] for name in EXPORT_FIELDS])
+
+
+def export_ndjson(restaurant):
+    for row in _export_rows(restaurant):
+        yield json.dumps(row, ensure_ascii=False) + '\n'
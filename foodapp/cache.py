@@ -0,0 +1,139 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+MENU_CACHE_TIMEOUT = getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60)
+
+
+# ======================
+# VERSION COUNTERS
+# ======================
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted counter never restarts at a
+        # value that older cached entries were stored under.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def _bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def _menu_version_key(restaurant_id=None):
+    if restaurant_id is None:
+        return 'menu:version'
+    return f'menu:version:{restaurant_id}'
+
+
+def get_menu_version(restaurant_id=None):
+    """
+    Current menu version for one restaurant, or for the whole public
+    menu when restaurant_id is None.
+    """
+    return _get_version(_menu_version_key(restaurant_id))
+
+
+def bump_menu_version(restaurant_id=None):
+    """Invalidate the public menu and, if given, one restaurant's menu."""
+    _bump_version(_menu_version_key(None))
+    if restaurant_id is not None:
+        _bump_version(_menu_version_key(restaurant_id))
+
+
+def get_profile_version(user_id):
+    return _get_version(f'profile:version:{user_id}')
+
+
+def bump_profile_version(user_id):
+    _bump_version(f'profile:version:{user_id}')
+
+
+def get_sales_version():
+    return _get_version('sales:version')
+
+
+def bump_sales_version():
+    _bump_version('sales:version')
+
+
+def get_related_version():
+    return _get_version('related:version')
+
+
+def bump_related_version():
+    _bump_version('related:version')
+
+
+def _row_version_key(label, pk):
+    return f'row:version:{label}:{pk}'
+
+
+def get_row_versions(label, pks):
+    """Version counters for many rows of one model, as {pk: version}"""
+    keys = {pk: _row_version_key(label, pk) for pk in pks}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for pk, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = _get_version(key)
+        versions[pk] = version
+    return versions
+
+
+def bump_row_version(label, pk):
+    _bump_version(_row_version_key(label, pk))
+
+
+def make_etag(*parts):
+    """Strong ETag from the given validator parts"""
+    raw = '|'.join(str(part) for part in parts)
+    return '"%s"' % hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+# ======================
+# RENDERED MENU READS
+# ======================
+def menu_cache_key(audience, restaurant_id, request, kind='list'):
+    """
+    Key for a fully rendered menu read (the list, facets, ...). The host is
+    part of the key because image URLs are absolute, and the query string
+    because filters change the rows.
+    """
+    version = get_menu_version(restaurant_id)
+    params = sorted(request.query_params.lists())
+    raw = f'{request.scheme}://{request.get_host()}|{params}'
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'menu:{kind}:{audience}:{restaurant_id or "all"}:{version}:{digest}'
+
+
+def get_cached_menu(key):
+    return cache.get(key)
+
+
+def set_cached_menu(key, data):
+    cache.set(key, data, MENU_CACHE_TIMEOUT)
+
+
+# ======================
+# ROW FRAGMENTS
+# ======================
+def fragment_key(label, pk, version, variant):
+    return f'fragment:{label}:{pk}:{version}:{variant}'
+
+
+def get_fragments(keys):
+    return cache.get_many(keys)
+
+
+def set_fragments(fragments):
+    cache.set_many(fragments, MENU_CACHE_TIMEOUT)
@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from .models import Food
+
+
+# Upper bounds (exclusive) of the price histogram buckets; the last bucket
+# is open-ended.
+PRICE_BUCKETS = [
+    Decimal(str(edge)) for edge in getattr(settings, 'MENU_PRICE_BUCKETS', [2000, 5000, 10000, 20000])
+]
+
+
+def menu_facets(queryset):
+    """
+    Category counts, in-stock counts and a price histogram for queryset,
+    computed with one GROUP BY (category, price bucket).
+    """
+    bucket = Case(
+        *[When(price__lt=edge, then=Value(index)) for index, edge in enumerate(PRICE_BUCKETS)],
+        default=Value(len(PRICE_BUCKETS)),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset
+        .annotate(price_bucket=bucket)
+        .values('category', 'price_bucket')
+        .annotate(count=Count('pk'), in_stock=Count('pk', filter=~Q(stock=0)))
+        .order_by()
+    )
+
+    categories = {
+        value: {'category': value, 'label': label, 'count': 0, 'in_stock': 0}
+        for value, label in Food.CATEGORY_CHOICES
+    }
+    bucket_counts = [0] * (len(PRICE_BUCKETS) + 1)
+    total = in_stock = 0
+
+    for row in rows:
+        category = categories.setdefault(
+            row['category'],
+            {'category': row['category'], 'label': row['category'], 'count': 0, 'in_stock': 0},
+        )
+        category['count'] += row['count']
+        category['in_stock'] += row['in_stock']
+        bucket_counts[row['price_bucket']] += row['count']
+        total += row['count']
+        in_stock += row['in_stock']
+
+    edges = [None] + [str(edge) for edge in PRICE_BUCKETS] + [None]
+    price_buckets = [
+        {'min': edges[index], 'max': edges[index + 1], 'count': count}
+        for index, count in enumerate(bucket_counts)
+    ]
+
+    return {
+        'total': total,
+        'in_stock': in_stock,
+        'categories': list(categories.values()),
+        'price_buckets': price_buckets,
+    }
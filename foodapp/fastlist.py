@@ -0,0 +1,137 @@
+"""
+Serializer-free list rendering.
+
+Large read-only lists spend most of their time instantiating and walking
+DRF serializers per row. FastRows compiles a serializer's fields once into
+(column, mapper) pairs and builds the same dicts straight from
+QuerySet.values(), one extra values() query per nested reverse relation.
+
+The output must stay identical to the serializer's, so mappers reuse the
+serializer fields' own to_representation wherever it does real work
+(decimals, datetimes) and pass plain columns through untouched.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+# Fields whose representation of a database value is the value itself
+PASSTHROUGH_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.ChoiceField,
+    serializers.IntegerField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+CONVERTED_FIELDS = (
+    serializers.DateField,
+    serializers.DateTimeField,
+    serializers.DecimalField,
+    serializers.FloatField,
+)
+
+
+class UnsupportedField(Exception):
+    pass
+
+
+def _passthrough(value):
+    return value
+
+
+class FastRows:
+    def __init__(self, serializer, model):
+        self.model = model
+        self.pk = model._meta.pk.attname
+        self.columns = [self.pk]
+        # (output name, column, mapper) in serializer field order; nested
+        # reverse relations have column None and are filled by render()
+        self.fields = []
+        # output name -> (FastRows for the child model, FK column on it)
+        self.nested = {}
+
+        meta = getattr(serializer, 'Meta', None)
+        field_sources = getattr(meta, 'field_sources', {})
+        fast_mappers = getattr(meta, 'fast_mappers', {})
+        reverse = {rel.get_accessor_name(): rel for rel in model._meta.related_objects}
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+
+            if isinstance(field, serializers.ListSerializer):
+                rel = reverse.get(field.source)
+                if rel is None or not isinstance(field.child, serializers.ModelSerializer):
+                    raise UnsupportedField(name)
+                child = FastRows(field.child, rel.related_model)
+                child.columns.append(rel.field.attname)
+                self.nested[name] = (child, rel.field.attname)
+                self.fields.append((name, None, None))
+                continue
+
+            if name in fast_mappers:
+                column = field_sources[name][0]
+                mapper = getattr(serializer, fast_mappers[name])
+            elif field.source == '*' or isinstance(field, serializers.BaseSerializer):
+                raise UnsupportedField(name)
+            elif isinstance(field, CONVERTED_FIELDS):
+                column = field.source.replace('.', '__')
+                mapper = field.to_representation
+            elif isinstance(field, PASSTHROUGH_FIELDS):
+                column = field.source.replace('.', '__')
+                mapper = _passthrough
+            else:
+                raise UnsupportedField(name)
+
+            try:
+                model._meta.get_field(column.split('__')[0])
+            except FieldDoesNotExist:
+                raise UnsupportedField(name)
+
+            if column not in self.columns:
+                self.columns.append(column)
+            self.fields.append((name, column, mapper))
+
+    def build(self, queryset):
+        return self.render(list(queryset.values(*self.columns)))
+
+    def render(self, rows):
+        nested = {}
+        ids = [row[self.pk] for row in rows]
+        for name, (child, fk_column) in self.nested.items():
+            child_rows = list(
+                child.model._base_manager
+                .filter(**{f'{fk_column}__in': ids})
+                .values(*child.columns)
+            ) if ids else []
+            grouped = defaultdict(list)
+            for child_row, rendered in zip(child_rows, child.render(child_rows)):
+                grouped[child_row[fk_column]].append(rendered)
+            nested[name] = grouped
+
+        output = []
+        for row in rows:
+            item = {}
+            for name, column, mapper in self.fields:
+                if column is None:
+                    item[name] = nested[name].get(row[self.pk], [])
+                else:
+                    value = row[column]
+                    item[name] = None if value is None else mapper(value)
+            output.append(item)
+        return output
+
+
+def build_fast_list(serializer, queryset):
+    """
+    Render queryset the way serializer (an unbound instance carrying the
+    request context) would, or return None if the serializer has fields the
+    fast path can't handle.
+    """
+    try:
+        fast_rows = FastRows(serializer, queryset.model)
+    except UnsupportedField:
+        return None
+    return fast_rows.build(queryset.prefetch_related(None))
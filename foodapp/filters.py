@@ -0,0 +1,83 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Food
+
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+# Signed 64-bit, the widest integer column any backend stores; drivers
+# raise OverflowError on anything past it
+MIN_INT = -2 ** 63
+MAX_INT = 2 ** 63 - 1
+
+
+def parse_bool(name, value):
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValidationError({name: 'Expected true or false.'})
+
+
+def parse_int(name, value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: 'Expected an integer.'})
+    if not MIN_INT <= value <= MAX_INT:
+        raise ValidationError({name: 'Integer out of range.'})
+    return value
+
+
+def parse_decimal(name, value):
+    try:
+        value = Decimal(value)
+    except (TypeError, InvalidOperation):
+        raise ValidationError({name: 'Expected a number.'})
+    if not value.is_finite():
+        # NaN and Infinity parse, but no DecimalField lookup accepts them
+        raise ValidationError({name: 'Expected a number.'})
+    return value
+
+
+class FoodFilter(BaseFilterBackend):
+    """
+    Menu filters evaluated in SQL:
+    ?category=, ?restaurant=, ?min_price=, ?max_price=, ?in_stock=
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        category = params.get('category')
+        if category:
+            if category not in dict(Food.CATEGORY_CHOICES):
+                raise ValidationError({'category': f'Unknown category: {category}'})
+            queryset = queryset.filter(category=category)
+
+        restaurant = params.get('restaurant')
+        if restaurant:
+            queryset = queryset.filter(restaurant_id=parse_int('restaurant', restaurant))
+
+        min_price = params.get('min_price')
+        if min_price:
+            queryset = queryset.filter(price__gte=parse_decimal('min_price', min_price))
+
+        max_price = params.get('max_price')
+        if max_price:
+            queryset = queryset.filter(price__lte=parse_decimal('max_price', max_price))
+
+        in_stock = params.get('in_stock')
+        if in_stock:
+            if parse_bool('in_stock', in_stock):
+                # Untracked stock (null) never runs out
+                queryset = queryset.exclude(stock=0)
+            else:
+                queryset = queryset.filter(stock=0)
+
+        return queryset
@@ -0,0 +1,88 @@
+"""
+Per-row fragment cache for list responses.
+
+Each row's rendered representation is cached under (model, pk, row version,
+variant). Row versions are counters bumped by model signals, the variant
+covers everything else the representation depends on (serializer, host,
+?fields=/?expand=, plus any dependency versions the view passes in). Rows
+that render other rows (an order's items show food names and prices) also
+carry a digest of those rows' versions, so only they go stale when one
+changes. A list request reads only primary keys, fetches the matching
+fragments in one cache round trip, and serializes just the rows that
+missed.
+"""
+import hashlib
+
+from .cache import fragment_key, get_fragments, get_row_versions, set_fragments
+
+
+def fragment_variant(serializer_class, request, dependencies=()):
+    params = []
+    if request is not None:
+        params = [
+            (name, request.query_params.getlist(name))
+            for name in ('fields', 'expand') if name in request.query_params
+        ]
+        host = f'{request.scheme}://{request.get_host()}'
+    else:
+        host = ''
+    raw = f'{serializer_class.__module__}.{serializer_class.__name__}|{host}|{params}|{list(dependencies)}'
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def related_versions(rows, *models):
+    """
+    {pk: digest} from (pk, related pk, ...) rows, one related pk per model
+    (None for no row), the digest covering the row versions of every
+    related row each pk points at
+    """
+    related = {}
+    for pk, *related_pks in rows:
+        entry = related.setdefault(pk, set())
+        for model, related_pk in zip(models, related_pks):
+            if related_pk is not None:
+                entry.add((model._meta.label_lower, related_pk))
+
+    versions = {}
+    for model in models:
+        label = model._meta.label_lower
+        ids = {related_pk for entry in related.values() for key, related_pk in entry if key == label}
+        for related_pk, version in get_row_versions(label, ids).items():
+            versions[label, related_pk] = version
+    return {
+        pk: hashlib.md5(str(sorted((key, versions[key]) for key in entry)).encode('utf-8')).hexdigest()
+        for pk, entry in related.items()
+    }
+
+
+def render_with_fragments(serializer_class, queryset, context, dependencies=(), row_dependencies=None):
+    """
+    Render queryset like serializer_class(queryset, many=True).data, reusing
+    cached row fragments and serializing only the misses. row_dependencies,
+    if given, maps the page's pks to {pk: version of what that row renders
+    besides itself}.
+    """
+    model = queryset.model
+    label = model._meta.label_lower
+    pks = list(queryset.values_list('pk', flat=True))
+    if not pks:
+        return []
+
+    variant = fragment_variant(serializer_class, context.get('request'), dependencies)
+    versions = get_row_versions(label, pks)
+    if row_dependencies is not None:
+        extra = row_dependencies(pks)
+        versions = {pk: f'{version}.{extra.get(pk, "")}' for pk, version in versions.items()}
+    keys = {pk: fragment_key(label, pk, versions[pk], variant) for pk in pks}
+    cached = get_fragments(list(keys.values()))
+
+    missing = [pk for pk in pks if keys[pk] not in cached]
+    if missing:
+        instances = list(queryset.filter(pk__in=missing))
+        rendered = serializer_class(instances, many=True, context=context).data
+        fresh = {keys[instance.pk]: row for instance, row in zip(instances, rendered)}
+        set_fragments(fresh)
+        cached.update(fresh)
+
+    # A row deleted between the two queries has no fragment; drop it
+    return [cached[keys[pk]] for pk in pks if keys[pk] in cached]
@@ -0,0 +1,58 @@
+"""
+Decoding and normalising uploaded photos.
+
+This module runs inside the upload process pool (see foodapp.uploads), so
+it must not import Django models or settings: a spawned worker only has
+Pillow and the arguments it was given.
+"""
+import io
+import warnings
+
+from PIL import Image, ImageOps
+
+
+# (Pillow format, extension, save options). Photos are re-encoded as JPEG;
+# anything with transparency as WebP.
+OPAQUE_OUTPUT = ('JPEG', 'jpg', {'quality': 88, 'optimize': True, 'progressive': True})
+ALPHA_OUTPUT = ('WEBP', 'webp', {'quality': 90, 'method': 4})
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF')
+
+
+class ImageProcessingError(Exception):
+    pass
+
+
+def prepare_image(path, max_edge, max_pixels):
+    """
+    Decode the staged upload at path, apply and drop its EXIF orientation
+    (and with it GPS and camera metadata), shrink it to max_edge and
+    re-encode it. Returns (bytes, extension).
+
+    Images over max_pixels are refused before their pixels are decoded.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        try:
+            with Image.open(path) as image:
+                if image.format not in ALLOWED_FORMATS:
+                    raise ImageProcessingError(f'Unsupported image format {image.format}')
+                if image.width * image.height > max_pixels:
+                    raise ImageProcessingError('Image has too many pixels')
+                # JPEGs can decode straight at a reduced scale
+                image.draft('RGB', (max_edge, max_edge))
+                image.load()
+                image = ImageOps.exif_transpose(image)
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombWarning,
+                Image.DecompressionBombError) as exc:
+            raise ImageProcessingError(f'Could not decode image: {exc}') from exc
+
+    alpha = image.has_transparency_data
+    image = image.convert('RGBA' if alpha else 'RGB')
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    image_format, extension, options = ALPHA_OUTPUT if alpha else OPAQUE_OUTPUT
+    buffer = io.BytesIO()
+    # No exif= / icc_profile= here: the stored original carries no metadata
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue(), extension
@@ -0,0 +1,235 @@
+"""
+Resized variants of uploaded food photos.
+
+Every upload gets thumb/medium/large copies in WebP and JPEG so menu
+viewers never download the camera original. Variants are generated on a
+small worker pool after the upload commits, and their names are recorded in
+Food.image_variants, which FoodSerializer turns into a srcset-style map.
+Until they exist, clients fall back to the original `image` URL.
+
+Resizing and encoding happen inside Pillow's C code, which releases the
+GIL, so threads are enough to keep this off the request thread.
+"""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import bump_menu_version, bump_row_version
+from .menu import refresh_menu_entries
+from .models import Food
+from .storage import is_content_addressed
+
+
+# Name -> longest edge in pixels
+IMAGE_VARIANTS = getattr(settings, 'FOOD_IMAGE_VARIANTS', {'thumb': 160, 'medium': 480, 'large': 1024})
+
+IMAGE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+IMAGE_WORKERS = getattr(settings, 'FOOD_IMAGE_WORKERS', 2)
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='food-images')
+    return _pool
+
+
+def variant_name(original, variant, extension):
+    """
+    foods/pilau.jpg -> foods/variants/pilau/thumb.webp (content-addressed
+    storage then swaps the file name for the variant's hash)
+    """
+    directory, filename = os.path.split(original)
+    stem = os.path.splitext(filename)[0]
+    return f'{directory}/variants/{stem}/{variant}.{extension}'
+
+
+def _encode(image, image_format, options):
+    if image_format == 'JPEG' and image.mode == 'RGBA':
+        # JPEG has no alpha: flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(original, storage):
+    """
+    Write every variant of the stored image `original` and return the
+    image_variants mapping for it.
+    """
+    largest = max(IMAGE_VARIANTS.values())
+    with storage.open(original, 'rb') as source:
+        image = Image.open(source)
+        # JPEGs can decode straight at a reduced scale that is still at
+        # least as big as the largest variant
+        image.draft('RGB', (largest, largest))
+        image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+
+    variants = {}
+    for variant, edge in sorted(IMAGE_VARIANTS.items(), key=lambda item: item[1]):
+        resized = image.copy()
+        # thumbnail() never upscales, so small originals keep their size
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        entry = {'width': resized.width, 'height': resized.height}
+        for extension, (image_format, options) in IMAGE_FORMATS.items():
+            name = variant_name(original, variant, extension)
+            entry[extension] = storage.save(name, ContentFile(_encode(resized, image_format, options)))
+        variants[variant] = entry
+    return variants
+
+
+def _image_updated(food_id):
+    """Do what Food's save signals would have, after a queryset update()"""
+    restaurant_id = Food.all_objects.filter(pk=food_id).values_list('restaurant_id', flat=True).first()
+    refresh_menu_entries([food_id])
+    label = Food._meta.label_lower
+    transaction.on_commit(lambda: bump_row_version(label, food_id))
+    transaction.on_commit(lambda: bump_menu_version(restaurant_id))
+
+
+def generate_variants(food_id, original):
+    """
+    Build the variants for one food's current image and record them. Does
+    nothing if the food's image changed in the meantime.
+    """
+    storage = Food._meta.get_field('image').storage
+    variants = render_variants(original, storage)
+
+    with transaction.atomic():
+        updated = Food.all_objects.filter(pk=food_id, image=original).update(image_variants=variants)
+        if not updated:
+            return None
+        _image_updated(food_id)
+    return variants
+
+
+def _run_in_worker(food_id, original):
+    try:
+        generate_variants(food_id, original)
+    except Exception:
+        # Nobody waits on the future; the original image keeps being served
+        logger.exception('Could not build image variants for food %s (%s)', food_id, original)
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(food):
+    """
+    Queue variant generation for food's image once the current transaction
+    commits. With settings.FOOD_IMAGE_VARIANTS_ASYNC off (tests, scripts)
+    it runs inline instead.
+    """
+    if not food.image:
+        return
+    food_id, original = food.pk, food.image.name
+
+    def submit():
+        if getattr(settings, 'FOOD_IMAGE_VARIANTS_ASYNC', True):
+            get_pool().submit(_run_in_worker, food_id, original)
+        else:
+            generate_variants(food_id, original)
+
+    transaction.on_commit(submit)
+
+
+# ======================
+# GARBAGE COLLECTION
+# ======================
+def referenced_names():
+    """Every stored name some Food (tombstones included) points at"""
+    names = set()
+    for image, variants in Food.all_objects.exclude(image='').values_list('image', 'image_variants'):
+        if image:
+            names.add(image)
+        for entry in (variants or {}).values():
+            names.update(value for key, value in entry.items() if key in ('webp', 'jpeg'))
+    return names
+
+
+def readdress_images():
+    """
+    Move images stored before content addressing onto their hash names, so
+    duplicates collapse into one file and the old names become garbage.
+    Returns how many foods were updated.
+    """
+    storage = Food._meta.get_field('image').storage
+    moved = 0
+    legacy = [
+        (food_id, name)
+        for food_id, name in Food.all_objects.exclude(image='').values_list('id', 'image')
+        if name and not is_content_addressed(name) and storage.exists(name)
+    ]
+    for food_id, name in legacy:
+        with storage.open(name, 'rb') as source:
+            new_name = storage.save(name, source)
+        with transaction.atomic():
+            if not Food.all_objects.filter(pk=food_id, image=name).update(image=new_name):
+                continue
+            _image_updated(food_id)
+        moved += 1
+    return moved
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for filename in files:
+        yield f'{directory}/{filename}' if directory else filename
+    for child in directories:
+        yield from _walk(storage, f'{directory}/{child}' if directory else child)
+
+
+def collect_garbage(storage, root='foods', grace=timedelta(hours=1), dry_run=False):
+    """
+    Delete files under root that no Food references. Files younger than
+    grace are kept: their Food row may not have committed yet. Saving
+    bytes that are already stored touches the file, so a re-upload of an
+    orphan is young again too.
+    Returns the names removed (or that would be, with dry_run).
+    """
+    if not storage.exists(root):
+        return []
+    keep = referenced_names()
+    cutoff = timezone.now() - grace
+    candidates = [
+        name for name in _walk(storage, root)
+        if name not in keep and storage.get_modified_time(name) <= cutoff
+    ]
+    if not candidates:
+        return []
+
+    # The walk can take a while on a big bucket: look again right before
+    # deleting, so anything referenced or re-uploaded meanwhile survives
+    keep = referenced_names()
+    removed = []
+    for name in candidates:
+        if name in keep or storage.get_modified_time(name) > cutoff:
+            continue
+        if not dry_run:
+            storage.delete(name)
+        removed.append(name)
+    return removed
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from foodapp.images import IMAGE_WORKERS, generate_variants
+from foodapp.models import Food
+
+
+class Command(BaseCommand):
+    help = (
+        "Build thumb/medium/large WebP and JPEG variants for food images "
+        "that don't have them yet (all images with --force)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild existing variants too')
+        parser.add_argument('--workers', type=int, default=IMAGE_WORKERS)
+
+    def handle(self, *args, **options):
+        foods = Food.all_objects.exclude(image='').exclude(image__isnull=True)
+        if not options['force']:
+            foods = foods.filter(image_variants={})
+        pending = list(foods.values_list('id', 'image'))
+
+        def build(item):
+            food_id, original = item
+            try:
+                return food_id, generate_variants(food_id, original), None
+            except Exception as exc:
+                return food_id, None, exc
+            finally:
+                close_old_connections()
+
+        done = failed = 0
+        if options['workers'] > 1:
+            pool = ThreadPoolExecutor(max_workers=options['workers'])
+            results = pool.map(build, pending)
+        else:
+            pool, results = None, map(build, pending)
+
+        for food_id, variants, error in results:
+            if error is not None:
+                failed += 1
+                self.stderr.write(f'Food {food_id}: {error}')
+            elif variants is not None:
+                done += 1
+        if pool is not None:
+            pool.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Built variants for {done} of {len(pending)} images ({failed} failed)'
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from foodapp.sales import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the food sales rollup behind /api/foods/popular/ from all "
+        "delivered orders. Run once after deploying it, or to repair drift."
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_rollup()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} food sales rollup rows'))
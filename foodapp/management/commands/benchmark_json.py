@@ -0,0 +1,95 @@
+import io
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from foodapp.models import Food, Order, OrderItem
+from foodapp.renderers import FastJSONParser, FastJSONRenderer, orjson
+from foodapp.serializers import OrderSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the stdlib and fast JSON renderers/parsers on a staff_orders "
+        "style response. Sample data is created in a transaction and rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--items', type=int, default=3, help='Items per order')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                payload = self.build_payload(options['orders'], options['items'])
+                self.run(payload, options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def build_payload(self, order_count, items_per_order):
+        customer = User.objects.create_user(username='__bench_customer__', password=None)
+        foods = Food.objects.bulk_create([
+            Food(name=f'Bench dish {i}', price=Decimal('1500.50') + i, stock=100)
+            for i in range(items_per_order)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(customer=customer, total_price=Decimal('4500.75'), delivery_address=f'Bench street {i}')
+            for i in range(order_count)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, food=food, quantity=2, price=food.price)
+            for order in orders for food in foods
+        ])
+
+        request = APIRequestFactory().get('/api/orders/staff_orders/')
+        queryset = OrderSerializer.optimize_queryset(
+            Order.objects.filter(customer=customer).order_by('-created_at'), request
+        )
+        data = OrderSerializer(queryset, many=True, context={'request': request}).data
+        return {'total': len(data), 'orders': data}
+
+    def run(self, payload, repeat):
+        self.stdout.write(f"orjson installed: {orjson is not None}")
+        self.stdout.write(f"orders: {payload['total']}")
+
+        baseline = JSONRenderer().render(payload)
+        self.stdout.write(f"payload: {len(baseline) / 1024:.0f} KiB")
+
+        with override_settings(API_JSON_BACKEND='auto'):
+            fast = FastJSONRenderer().render(payload)
+        if fast != baseline:
+            self.stderr.write(self.style.WARNING("fast renderer output differs from JSONRenderer"))
+
+        results = [
+            ('render  stdlib', lambda: JSONRenderer().render(payload)),
+            ('render  fast', lambda: FastJSONRenderer().render(payload)),
+            ('parse   stdlib', lambda: self.parse(baseline, 'stdlib')),
+            ('parse   fast', lambda: self.parse(baseline, 'auto')),
+        ]
+        for label, func in results:
+            backend = 'stdlib' if label.endswith('stdlib') else 'auto'
+            with override_settings(API_JSON_BACKEND=backend):
+                best = min(self.time(func) for _ in range(repeat))
+            self.stdout.write(f"{label}: {best * 1000:8.1f} ms")
+
+    def parse(self, body, backend):
+        with override_settings(API_JSON_BACKEND=backend):
+            return FastJSONParser().parse(io.BytesIO(body), parser_context={'encoding': 'utf-8'})
+
+    @staticmethod
+    def time(func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
@@ -0,0 +1,85 @@
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils.http import http_date
+from django.views.static import serve
+
+from foodapp.media import serve_media
+from foodapp.storage import ContentAddressedStorage
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare django.views.static.serve with foodapp.media.serve_media on "
+        "concurrent image fetches. Requests run in-process on a thread pool, "
+        "so the numbers are worker time per request (what ties up gunicorn "
+        "workers), not network throughput; sendfile() and X-Accel offload "
+        "save more than shown here."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=50)
+        parser.add_argument('--size-kb', type=int, default=400, help='Size of each image')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as root:
+            storage = ContentAddressedStorage(location=root)
+            names = [
+                storage.save('foods/photo.jpg', ContentFile(os.urandom(options['size_kb'] * 1024)))
+                for _ in range(options['files'])
+            ]
+            self.stdout.write(
+                f"{len(names)} files of {options['size_kb']} KiB, "
+                f"{options['requests']} requests, concurrency {options['concurrency']}"
+            )
+
+            factory = RequestFactory()
+            etags = {}
+            for name in names:
+                etags[name] = serve_media(factory.get('/'), name, document_root=root)['ETag']
+            last_modified = http_date(os.stat(os.path.join(root, names[0])).st_mtime + 1)
+
+            scenarios = [
+                ('static.serve   full', lambda name: serve(factory.get('/'), name, document_root=root)),
+                ('serve_media    full', lambda name: serve_media(factory.get('/'), name, document_root=root)),
+                ('serve_media    x-accel', lambda name: serve_media(
+                    factory.get('/'), name, document_root=root, mode='x-accel')),
+                ('serve_media    range 64K', lambda name: serve_media(
+                    factory.get('/', HTTP_RANGE='bytes=0-65535'), name, document_root=root)),
+                ('static.serve   revalidate', lambda name: serve(
+                    factory.get('/', HTTP_IF_MODIFIED_SINCE=last_modified), name, document_root=root)),
+                ('serve_media    revalidate', lambda name: serve_media(
+                    factory.get('/', HTTP_IF_NONE_MATCH=etags[name]), name, document_root=root)),
+            ]
+            for label, fetch in scenarios:
+                self.run(label, fetch, names, options['requests'], options['concurrency'])
+
+    def run(self, label, fetch, names, total, concurrency):
+        def one(index):
+            start = time.perf_counter()
+            response = fetch(names[index % len(names)])
+            received = sum(len(chunk) for chunk in response) if response.streaming else len(response.content)
+            response.close()
+            return time.perf_counter() - start, received
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, range(total)))
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(latency for latency, _ in results)
+        received = sum(size for _, size in results)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"{label:28} {total / elapsed:8.0f} req/s  "
+            f"p50 {statistics.median(latencies) * 1000:6.2f} ms  p95 {p95 * 1000:6.2f} ms  "
+            f"{received / elapsed / 1024 / 1024:7.1f} MiB/s"
+        )
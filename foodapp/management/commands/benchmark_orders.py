@@ -0,0 +1,91 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, transaction
+from rest_framework.exceptions import ValidationError
+
+from foodapp.models import Food, Order
+from foodapp.serializers import OrderCreateSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Place concurrent orders for one dish and check stock never goes "
+        "below zero. 'reserve' is the real order path (conditional UPDATE); "
+        "'read-modify-write' reads stock in Python and writes it back, to "
+        "show the lost updates reservation prevents. Sample data is committed "
+        "(the threads need to see it) and deleted afterwards. SQLite "
+        "serializes writers, so run against Postgres for meaningful numbers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=400)
+        parser.add_argument('--quantity', type=int, default=1, help='Portions per order')
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        customer = User.objects.create_user(username='__bench_orders__', password=None)
+        try:
+            self.stdout.write(
+                f"stock {options['stock']}, {options['orders']} orders of {options['quantity']}, "
+                f"concurrency {options['concurrency']}"
+            )
+            for label, place in (('reserve', self.reserve), ('read-modify-write', self.read_modify_write)):
+                food = Food.objects.create(name='Bench dish', price=Decimal('1500.00'), stock=options['stock'])
+                try:
+                    self.run(label, place, customer, food, options)
+                finally:
+                    Order.objects.filter(customer=customer).delete()
+                    Food.all_objects.filter(pk=food.pk).delete()
+        finally:
+            customer.delete()
+
+    def reserve(self, customer, food, quantity):
+        serializer = OrderCreateSerializer(
+            data={'delivery_address': 'Bench street', 'items': [{'food': food.pk, 'quantity': quantity}]},
+            context={'request': SimpleNamespace(user=customer)},
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+    def read_modify_write(self, customer, food, quantity):
+        with transaction.atomic():
+            current = Food.objects.get(pk=food.pk).stock
+            if current < quantity:
+                raise ValidationError('Not enough stock')
+            Order.objects.create(customer=customer, total_price=food.price * quantity, delivery_address='Bench street')
+            Food.objects.filter(pk=food.pk).update(stock=current - quantity)
+
+    def run(self, label, place, customer, food, options):
+        quantity = options['quantity']
+
+        def one(_):
+            try:
+                place(customer, food, quantity)
+                return 'placed'
+            except ValidationError:
+                return 'refused'
+            except DatabaseError:
+                return 'error'
+            finally:
+                close_old_connections()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            outcomes = list(pool.map(one, range(options['orders'])))
+        elapsed = time.perf_counter() - start
+
+        placed = outcomes.count('placed')
+        remaining = Food.all_objects.get(pk=food.pk).stock
+        # Portions sold beyond what there was, or lost from the count
+        oversold = placed * quantity - (options['stock'] - remaining)
+        self.stdout.write(
+            f"{label:18} {options['orders'] / elapsed:7.0f} orders/s  placed {placed:5}  "
+            f"refused {outcomes.count('refused'):5}  errors {outcomes.count('error'):4}  "
+            f"stock left {remaining:5}  oversold {oversold}"
+        )
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from foodapp.images import collect_garbage, readdress_images
+from foodapp.models import Food
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete food image files (originals and variants) that no Food "
+        "references. With --readdress, first move images stored before "
+        "content addressing onto hash names so duplicates collapse."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List files without deleting them')
+        parser.add_argument('--readdress', action='store_true')
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help='Keep files younger than this; their upload may still be committing',
+        )
+
+    def handle(self, *args, **options):
+        if options['readdress'] and not options['dry_run']:
+            moved = readdress_images()
+            self.stdout.write(f'Moved {moved} images to content-addressed names')
+
+        storage = Food._meta.get_field('image').storage
+        removed = collect_garbage(
+            storage, grace=timedelta(minutes=options['grace_minutes']), dry_run=options['dry_run']
+        )
+        for name in removed:
+            self.stdout.write(f'  {name}')
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(removed)} unreferenced files'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from foodapp.uploads import (
+    expire_direct_uploads, expire_resumable, process_staged, remove_stale_parts, staged_uploads,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Process food photos left in the upload staging directory, e.g. "
+        "after a restart interrupted the upload pool, and delete partial "
+        "uploads whose request never finished, and resumable or direct "
+        "uploads the client abandoned."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes', type=int, default=60,
+            help='Delete partial uploads older than this',
+        )
+        parser.add_argument(
+            '--resumable-hours', type=int, default=24,
+            help='Delete resumable and direct uploads left unfinished for this long',
+        )
+
+    def handle(self, *args, **options):
+        removed = remove_stale_parts(options['stale_minutes'] * 60)
+        if removed:
+            self.stdout.write(f'Removed {removed} partial uploads')
+        expired = expire_resumable(options['resumable_hours'] * 3600)
+        if expired:
+            self.stdout.write(f'Expired {expired} resumable uploads')
+        expired = expire_direct_uploads(options['resumable_hours'] * 3600)
+        if expired:
+            self.stdout.write(f'Expired {expired} direct uploads')
+
+        paths = staged_uploads()
+        stored = 0
+        for path in paths:
+            # Oldest first, so a food ends up with its newest photo
+            if process_staged(path, in_process=True):
+                stored += 1
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} of {len(paths)} staged uploads'))
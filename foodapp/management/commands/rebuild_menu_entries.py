@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from foodapp.menu import rebuild_menu_entries
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the public menu read table (MenuEntry) from Food. Normal "
+        "writes keep it in step; use this to repair it after raw SQL edits."
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild_menu_entries()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} menu entries'))
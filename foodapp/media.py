@@ -0,0 +1,252 @@
+"""
+Serving uploaded media.
+
+serve_media() replaces django.views.static.serve for /media/:
+
+- Conditional requests: a strong ETag (the content hash for
+  content-addressed files, else mtime+size) and Last-Modified, answered
+  with 304/412 before the file is opened.
+- Byte ranges: a single "bytes=" range (with If-Range) gets a 206.
+- Precompressed siblings: if "<file>.br" or "<file>.gz" exists and the
+  client accepts that encoding, it is sent instead.
+- Offload: with settings.MEDIA_SERVE_MODE = "x-accel" (nginx) or
+  "x-sendfile" (Apache, lighttpd) Django only checks the request and sets
+  headers; the web server streams the bytes, so no worker is tied up.
+  The default, "django", streams full files through FileResponse, which
+  gunicorn hands to sendfile().
+
+Content-addressed files (see foodapp.storage) never change behind their
+URL, so they are served as immutable for a year; anything else gets a short
+max-age so a replaced file shows up soon.
+
+receive_direct_upload() is the local stand-in for a bucket's presigned POST
+endpoint (see ContentAddressedStorage.presigned_upload). Files it receives
+land under incoming/, which is never served.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_safe
+
+from .models import Food
+from .storage import check_direct_upload, is_content_addressed
+
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+MUTABLE_MAX_AGE = getattr(settings, 'MEDIA_MAX_AGE', 60 * 60)
+
+# "django", "x-accel" or "x-sendfile"
+MEDIA_SERVE_MODE = getattr(settings, 'MEDIA_SERVE_MODE', 'django')
+# nginx "internal" location that maps onto MEDIA_ROOT
+MEDIA_ACCEL_PREFIX = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# Content-Encoding -> suffix of the precompressed sibling, best first
+PRECOMPRESSED = (('br', '.br'), ('gzip', '.gz'))
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+# Never served: direct uploads before they are checked and re-encoded
+PRIVATE_PREFIXES = ('incoming/',)
+
+
+def _etag(path, st):
+    if is_content_addressed(path):
+        return '"%s"' % os.path.splitext(os.path.basename(path))[0]
+    return '"%x-%x"' % (st.st_mtime_ns, st.st_size)
+
+
+def _accepted_encodings(request):
+    header = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    accepted = set()
+    for part in header.split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def _precompressed(request, full_path):
+    """(path, encoding) of the best precompressed sibling, or (full_path, None)"""
+    accepted = _accepted_encodings(request)
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return full_path + suffix, encoding
+    return full_path, None
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to ignore the
+    header (malformed or multiple ranges), or False if unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return False
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _finish(response, path, etag, last_modified, encoding):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    response['X-Content-Type-Options'] = 'nosniff'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if is_content_addressed(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=MUTABLE_MAX_AGE)
+    return response
+
+
+@require_safe
+def serve_media(request, path, document_root=None, mode=None):
+    document_root = document_root or settings.MEDIA_ROOT
+    mode = mode or MEDIA_SERVE_MODE
+    try:
+        full_path = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    # Checks below go by where the path resolves to, so "./" and "../"
+    # segments can't route around them
+    path = os.path.relpath(full_path, os.path.abspath(document_root)).replace(os.sep, '/')
+    if os.path.basename(full_path).startswith('.') or path.startswith(PRIVATE_PREFIXES):
+        # Hidden files, including in-flight uploads, and unchecked direct uploads
+        raise Http404('Not found')
+
+    file_path, encoding = _precompressed(request, full_path)
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        raise Http404('Not found')
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404('Not found')
+
+    etag = _etag(path, st)
+    if encoding:
+        # A different representation needs its own validator
+        etag = etag[:-1] + '-' + encoding + '"'
+    last_modified = st.st_mtime
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if conditional is not None:
+        return _finish(conditional, path, etag, last_modified, None)
+
+    if mode == 'x-accel':
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(file_path, document_root).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX.rstrip('/') + '/' + relative
+        return _finish(response, path, etag, last_modified, encoding)
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = file_path
+        return _finish(response, path, etag, last_modified, encoding)
+
+    size = st.st_size
+    range_header = request.META.get('HTTP_RANGE')
+    byte_range = None
+    if range_header and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return _finish(response, path, etag, last_modified, None)
+
+    if byte_range is None or byte_range == (0, size - 1):
+        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        if end == size - 1:
+            # Open-ended: FileResponse sends from the current position,
+            # which keeps the sendfile() path
+            source = open(file_path, 'rb')
+            source.seek(start)
+            response = FileResponse(source, content_type=content_type, status=206)
+        else:
+            response = StreamingHttpResponse(
+                _read_range(file_path, start, length), content_type=content_type, status=206
+            )
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return _finish(response, path, etag, last_modified, encoding)
+
+
+@csrf_exempt
+@require_POST
+def receive_direct_upload(request):
+    """
+    Accept a presigned form POST (key, token, Content-Type, file) the way an
+    S3 bucket would: 204 on success, 403 when the policy doesn't hold.
+    """
+    try:
+        policy = check_direct_upload(
+            request.POST.get('token', ''), getattr(settings, 'DIRECT_UPLOAD_EXPIRES', 15 * 60)
+        )
+    except signing.BadSignature:
+        return HttpResponse('Invalid or expired upload policy', status=403)
+
+    upload = request.FILES.get('file')
+    if request.POST.get('key') != policy['key'] or upload is None:
+        return HttpResponse('Upload does not match its policy', status=403)
+    if not request.POST.get('Content-Type', '').startswith('image/'):
+        return HttpResponse('Content-Type must be an image type', status=403)
+    if not 0 < upload.size <= policy['max_bytes']:
+        return HttpResponse('File size is outside the allowed range', status=403)
+
+    Food._meta.get_field('image').storage.put_object(policy['key'], upload)
+    return HttpResponse(status=204)
@@ -0,0 +1,72 @@
+"""
+The public menu read model.
+
+MenuEntry holds one denormalized row per food on the public menu. Every
+write path that changes Food calls refresh_menu_entries() for the rows it
+touched, in the same transaction as the write (FoodViewSet wraps its saves
+in one), so the read table never shows a state the Food table didn't
+commit. Refreshes upsert, so two saves of one dish can't collide on the
+entry's primary key.
+
+Only the public list and facets read MenuEntry (FoodViewSet
+.menu_entry_actions). Public retrieve, search and related still read Food
+filtered to available dishes, and suggest uses its own in-memory index.
+"""
+from django.db import transaction
+
+from .cache import bump_menu_version, bump_row_version
+from .models import Food, MenuEntry
+
+
+ENTRY_FIELDS = [
+    'restaurant_id', 'name', 'description', 'price', 'stock', 'category', 'image', 'image_variants',
+    'updated_at',
+]
+
+# Model field names for the upsert's UPDATE ... SET
+UPSERT_FIELDS = ['restaurant' if name == 'restaurant_id' else name for name in ENTRY_FIELDS] + ['available']
+
+
+def _entries(foods):
+    for food in foods:
+        yield MenuEntry(
+            food_id=food['id'],
+            available=True,
+            **{name: food[name] for name in ENTRY_FIELDS}
+        )
+
+
+def _bump_entry_versions(food_ids):
+    label = MenuEntry._meta.label_lower
+    for food_id in food_ids:
+        bump_row_version(label, food_id)
+
+
+def refresh_menu_entries(food_ids):
+    """Re-copy the given foods into MenuEntry (or drop them if they left the menu)"""
+    food_ids = list(food_ids)
+    if not food_ids:
+        return
+    with transaction.atomic():
+        foods = list(Food.objects.filter(id__in=food_ids, available=True).values('id', *ENTRY_FIELDS))
+        if len(foods) < len(food_ids):
+            on_menu = [food['id'] for food in foods]
+            MenuEntry.objects.filter(food_id__in=food_ids).exclude(food_id__in=on_menu).delete()
+        if foods:
+            MenuEntry.objects.bulk_create(
+                _entries(foods), update_conflicts=True, unique_fields=['food'], update_fields=UPSERT_FIELDS
+            )
+        transaction.on_commit(lambda: _bump_entry_versions(food_ids))
+
+
+def rebuild_menu_entries(chunk_size=1000):
+    """Recreate the whole read table from Food"""
+    with transaction.atomic():
+        MenuEntry.objects.all().delete()
+        foods = Food.objects.filter(available=True).values('id', *ENTRY_FIELDS)
+        MenuEntry.objects.bulk_create(_entries(foods.iterator(chunk_size=chunk_size)), batch_size=chunk_size)
+
+        food_ids = list(MenuEntry.objects.values_list('food_id', flat=True))
+        transaction.on_commit(lambda: _bump_entry_versions(food_ids))
+        transaction.on_commit(bump_menu_version)
+    return len(food_ids)
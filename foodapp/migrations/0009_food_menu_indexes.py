@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0008_alter_notification_type_alter_profile_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['available', 'category', 'id'], name='food_avail_cat_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(fields=['restaurant', 'id'], name='food_restaurant_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0010_food_updated_at_deleted_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='counted_in_sales',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='FoodSalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to='foodapp.food')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'food'], name='food_sales_rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('food', 'day'), name='food_sales_rollup_food_day_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0011_food_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='counted_in_pairs',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='FoodPairCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='foodapp.food')),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='foodapp.food')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('food', 'other'), name='food_pair_count_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedFood',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('together_count', models.PositiveIntegerField()),
+                ('food', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_foods', to='foodapp.food')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='foodapp.food')),
+            ],
+            options={
+                'ordering': ['food', 'rank'],
+                'constraints': [models.UniqueConstraint(fields=('food', 'rank'), name='related_food_rank_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_menu_entries(apps, schema_editor):
+    # Public menu reads switch to this table as soon as it exists
+    Food = apps.get_model('foodapp', 'Food')
+    MenuEntry = apps.get_model('foodapp', 'MenuEntry')
+    foods = Food.objects.filter(available=True, deleted_at__isnull=True)
+    MenuEntry.objects.bulk_create(
+        (
+            MenuEntry(
+                food_id=food.id, restaurant_id=food.restaurant_id, name=food.name,
+                description=food.description, price=food.price, stock=food.stock,
+                category=food.category, image=food.image, available=True,
+                updated_at=food.updated_at,
+            )
+            for food in foods.iterator(chunk_size=1000)
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0012_food_recommendations'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuEntry',
+            fields=[
+                ('food', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='menu_entry', serialize=False, to='foodapp.food')),
+                ('name', models.CharField(max_length=100)),
+                ('description', models.TextField(blank=True, default='')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('stock', models.PositiveIntegerField(default=0)),
+                ('category', models.CharField(choices=[('Main', 'Main'), ('Appetizer', 'Appetizer'), ('Dessert', 'Dessert'), ('Drink', 'Drink'), ('Side', 'Side')], default='Main', max_length=20)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='foods/')),
+                ('available', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField()),
+                ('restaurant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'food'], name='menu_entry_cat_food_idx'), models.Index(fields=['restaurant', 'food'], name='menu_entry_rest_food_idx')],
+            },
+        ),
+        migrations.RunPython(populate_menu_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0013_menu_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='menuentry',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
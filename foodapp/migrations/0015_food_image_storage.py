@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:14
+
+import foodapp.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0014_food_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='food',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=foodapp.storage.food_image_storage, upload_to='foods/'),
+        ),
+        migrations.AlterField(
+            model_name='menuentry',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=foodapp.storage.food_image_storage, upload_to='foods/'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:30
+
+from django.db import migrations, models
+
+
+def untrack_empty_stock(apps, schema_editor):
+    # Stock was informational until orders started taking it: dishes on the
+    # menu at 0 were still orderable, so they keep selling, untracked
+    Food = apps.get_model('foodapp', 'Food')
+    MenuEntry = apps.get_model('foodapp', 'MenuEntry')
+    Food.objects.filter(stock=0, available=True).update(stock=None)
+    MenuEntry.objects.filter(stock=0).update(stock=None)
+
+
+def track_empty_stock(apps, schema_editor):
+    Food = apps.get_model('foodapp', 'Food')
+    MenuEntry = apps.get_model('foodapp', 'MenuEntry')
+    Food.objects.filter(stock__isnull=True).update(stock=0)
+    MenuEntry.objects.filter(stock__isnull=True).update(stock=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0015_food_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_reserved',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='food',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AlterField(
+            model_name='menuentry',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.RunPython(untrack_empty_stock, track_empty_stock),
+    ]
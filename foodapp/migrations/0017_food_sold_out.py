@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodapp', '0016_order_stock_reserved'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='sold_out',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .fastlist import build_fast_list
+from .fragments import render_with_fragments
+
+
+# ======================
+# CONDITIONAL GET
+# ======================
+class ConditionalGetMixin:
+    """
+    Conditional GET support for API views.
+
+    A handler calls not_modified(request, etag) before doing any real work;
+    it returns a 304 response when the client's If-None-Match already holds
+    that ETag. GET responses get the ETag plus the view's cache_control
+    directives, which each view can override.
+    """
+    cache_control = {'max_age': 0, 'must_revalidate': True}
+    etag = None
+
+    def not_modified(self, request, etag):
+        self.etag = etag
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            if '*' in etags or etag in etags:
+                return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+            if self.etag:
+                response['ETag'] = self.etag
+            if self.cache_control:
+                patch_cache_control(response, **self.cache_control)
+            # What a caller sees depends on who they are and which
+            # renderer (JSON, MessagePack) they negotiated
+            patch_vary_headers(response, ('Authorization', 'Accept'))
+        return response
+
+
+# ======================
+# SPARSE FIELDSETS
+# ======================
+class SparseQuerysetMixin:
+    """
+    Narrow read querysets to what the serializer will render for the
+    request's ?fields= / ?expand= (see SparseFieldsMixin.optimize_queryset).
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if (
+            self.request.method in SAFE_METHODS
+            and self.action in self.sparse_actions
+            and hasattr(serializer_class, 'optimize_queryset')
+        ):
+            queryset = serializer_class.optimize_queryset(queryset, self.request)
+        return queryset
+
+
+# ======================
+# FAST LISTS
+# ======================
+class FastListMixin:
+    """
+    Opt-in serializer-free list rendering (see foodapp.fastlist). Used when
+    settings.API_FAST_LISTS is on, the page isn't paginated and nothing is
+    expanded; otherwise the regular serializer path runs.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'API_FAST_LISTS', False) or 'expand' in request.query_params:
+            return super().list(request, *args, **kwargs)
+        if self.paginator is not None and self.paginator.get_page_size(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        data = build_fast_list(self.get_serializer(), queryset)
+        if data is None:
+            return super().list(request, *args, **kwargs)
+        return Response(data)
+
+
+# ======================
+# ROW FRAGMENT CACHE
+# ======================
+class FragmentCacheMixin:
+    """
+    Build unpaginated lists from cached per-row fragments (see
+    foodapp.fragments), serializing only rows whose version changed.
+    Switched off with settings.API_FRAGMENT_CACHE = False.
+    """
+
+    def get_fragment_dependencies(self):
+        """Versions of other data the rendered rows depend on"""
+        return ()
+
+    def get_fragment_row_dependencies(self, pks):
+        """{pk: version} of other rows each rendered row depends on"""
+        return {}
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'API_FRAGMENT_CACHE', True):
+            return super().list(request, *args, **kwargs)
+        if self.paginator is not None and self.paginator.get_page_size(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        data = render_with_fragments(
+            self.get_serializer_class(),
+            queryset,
+            self.get_serializer_context(),
+            self.get_fragment_dependencies(),
+            self.get_fragment_row_dependencies,
+        )
+        return Response(data)
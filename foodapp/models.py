@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .storage import food_image_storage
 
 # ======================
 # USER PROFILE (ROLES)
@@ -34,6 +36,13 @@ class Profile(models.Model):
 # ======================
 # FOOD TABLE
 # ======================
+class FoodManager(models.Manager):
+    """Default manager: hides soft-deleted foods (tombstones)"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Food(models.Model):
     CATEGORY_CHOICES = (
         ("Main", "Main"),
@@ -46,10 +55,15 @@ class Food(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, default="")
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    stock = models.PositiveIntegerField(default=0)
+    # Portions left, taken by orders (see foodapp.stock); null means the
+    # restaurant doesn't track stock for this dish
+    stock = models.PositiveIntegerField(null=True, blank=True, default=None)
     category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default="Main")
 
-    image = models.ImageField(upload_to="foods/", blank=True, null=True)
+    image = models.ImageField(upload_to="foods/", storage=food_image_storage, blank=True, null=True)
+    # Resized copies of image, filled in by foodapp.images:
+    # {"thumb": {"width": 160, "webp": "<name>", "jpeg": "<name>"}, ...}
+    image_variants = models.JSONField(default=dict, blank=True)
 
     restaurant = models.ForeignKey(
         User,
@@ -60,10 +74,34 @@ class Food(models.Model):
     )
 
     available = models.BooleanField(default=True)
+    # Off the menu only because orders took the last portion; cancelling
+    # one of them puts the dish back (see foodapp.stock)
+    sold_out = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Set instead of deleting the row, so syncing clients learn about removals
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = FoodManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # Public menu: available items, optionally by category, newest first
+            models.Index(fields=["available", "category", "id"], name="food_avail_cat_id_idx"),
+            # Restaurant-scoped menu, newest first
+            models.Index(fields=["restaurant", "id"], name="food_restaurant_id_idx"),
+            # Delta sync: rows changed after a (updated_at, id) cursor
+            models.Index(fields=["updated_at", "id"], name="food_updated_id_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
+    def soft_delete(self):
+        self.deleted_at = timezone.now()
+        self.available = False
+        self.save(update_fields=["deleted_at", "available", "updated_at"])
+
 
 # ======================
 # INVENTORY TABLE
@@ -121,6 +159,12 @@ class Order(models.Model):
     delivery_address = models.TextField(blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set once the order's items have been added to FoodSalesRollup
+    counted_in_sales = models.BooleanField(default=False)
+    # Set once the order's items have been added to FoodPairCount
+    counted_in_pairs = models.BooleanField(default=False)
+    # True while the order holds stock taken at placement (see foodapp.stock)
+    stock_reserved = models.BooleanField(default=False)
 
     def __str__(self):
         return f"Order {self.id}"
@@ -139,6 +183,94 @@ class OrderItem(models.Model):
         return f"{self.food.name} x {self.quantity}"
 
 
+# ======================
+# PUBLIC MENU READ TABLE
+# ======================
+class MenuEntry(models.Model):
+    """
+    Denormalized copy of every food on the public menu (available and not
+    deleted), kept in step with Food in the same transaction by
+    foodapp.menu. Customer menu reads go here, away from staff writes.
+    """
+    food = models.OneToOneField(Food, on_delete=models.CASCADE, primary_key=True, related_name="menu_entry")
+    restaurant = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    name = models.CharField(max_length=100)
+    description = models.TextField(blank=True, default="")
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    stock = models.PositiveIntegerField(null=True, blank=True, default=None)
+    category = models.CharField(max_length=20, choices=Food.CATEGORY_CHOICES, default="Main")
+    image = models.ImageField(upload_to="foods/", storage=food_image_storage, blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True)
+    available = models.BooleanField(default=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["category", "food"], name="menu_entry_cat_food_idx"),
+            models.Index(fields=["restaurant", "food"], name="menu_entry_rest_food_idx"),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+# ======================
+# FOOD SALES ROLLUP TABLE
+# ======================
+class FoodSalesRollup(models.Model):
+    """Delivered quantity and revenue per food per day (order creation date)"""
+    food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name="sales")
+    day = models.DateField()
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["food", "day"], name="food_sales_rollup_food_day_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["day", "food"], name="food_sales_rollup_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.food_id} on {self.day}: {self.quantity}"
+
+
+# ======================
+# FOOD RECOMMENDATION TABLES
+# ======================
+class FoodPairCount(models.Model):
+    """How many counted orders contained both foods. Stored in both directions."""
+    food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name="+")
+    other = models.ForeignKey(Food, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["food", "other"], name="food_pair_count_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.food_id} + {self.other_id}: {self.count}"
+
+
+class RelatedFood(models.Model):
+    """Top-k "frequently ordered together" foods per food, precomputed from FoodPairCount"""
+    food = models.ForeignKey(Food, on_delete=models.CASCADE, related_name="related_foods")
+    related = models.ForeignKey(Food, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    together_count = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ["food", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["food", "rank"], name="related_food_rank_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.food_id} -> {self.related_id} (#{self.rank})"
+
+
 # ======================
 # NOTIFICATION TABLE
 # ======================
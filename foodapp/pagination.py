@@ -0,0 +1,26 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class FoodCursorPagination(CursorPagination):
+    """
+    Keyset pagination on -pk (the food id, for Food and MenuEntry alike). It
+    is opt-in: the menu is only paginated when the client sends ?cursor= or
+    ?page_size=, so existing clients that expect a plain list keep working.
+    """
+    ordering = '-pk'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().get_page_size(request)
+
+
+class FoodSearchPagination(PageNumberPagination):
+    """Search results are ordered by rank, so they page by number"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
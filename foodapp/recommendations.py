@@ -0,0 +1,177 @@
+"""
+"Frequently ordered together" recommendations.
+
+FoodPairCount holds the sparse food-by-food co-occurrence matrix: for every
+pair of foods, how many counted orders contained both. RelatedFood holds
+each food's top-k row of that matrix, so /api/foods/<id>/related/ is one
+indexed lookup on (food, rank).
+
+rebuild_recommendations() recomputes everything in one pass (NumPy when it
+is installed); record_order_pairs() folds a single newly accepted order in
+and refreshes the top-k rows of just the foods it touched.
+"""
+from collections import Counter, defaultdict
+from itertools import permutations
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .cache import bump_related_version
+from .models import FoodPairCount, Order, OrderItem, RelatedFood
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+RELATED_TOP_K = getattr(settings, 'RELATED_FOODS_TOP_K', 10)
+
+# Orders the restaurant has accepted; pending ones may still be rejected
+COUNTED_STATUSES = ('approved', 'preparing', 'on the way', 'delivered')
+
+
+# ======================
+# BATCH REBUILD
+# ======================
+def _count_pairs_numpy(order_ids, food_ids):
+    """
+    Co-occurrence counts from (order, food) rows sorted by order, as
+    {(food, other): count}. Every food is paired with every other food in
+    the same order by expanding each order group into its full square and
+    dropping the diagonal.
+    """
+    order_ids = np.asarray(order_ids, dtype=np.int64)
+    food_ids = np.asarray(food_ids, dtype=np.int64)
+    foods, food_index = np.unique(food_ids, return_inverse=True)
+
+    # Start and size of each order's group, repeated per row
+    _, starts, sizes = np.unique(order_ids, return_index=True, return_counts=True)
+    row_sizes = np.repeat(sizes, sizes)
+    row_starts = np.repeat(starts, sizes)
+
+    left = np.repeat(np.arange(len(food_ids)), row_sizes)
+    offsets = np.arange(len(left)) - np.repeat(np.cumsum(row_sizes) - row_sizes, row_sizes)
+    right = np.repeat(row_starts, row_sizes) + offsets
+    keep = left != right
+
+    codes = food_index[left[keep]] * len(foods) + food_index[right[keep]]
+    codes, counts = np.unique(codes, return_counts=True)
+    rows, cols = np.divmod(codes, len(foods))
+    return {
+        (int(food), int(other)): int(count)
+        for food, other, count in zip(foods[rows], foods[cols], counts)
+    }
+
+
+def _count_pairs_python(order_ids, food_ids):
+    groups = defaultdict(list)
+    for order_id, food_id in zip(order_ids, food_ids):
+        groups[order_id].append(food_id)
+    counts = Counter()
+    for foods in groups.values():
+        counts.update(permutations(foods, 2))
+    return dict(counts)
+
+
+def count_pairs(order_ids, food_ids):
+    if not order_ids:
+        return {}
+    if np is not None:
+        return _count_pairs_numpy(order_ids, food_ids)
+    return _count_pairs_python(order_ids, food_ids)
+
+
+def top_related(pair_counts, k=RELATED_TOP_K):
+    """{food: [(other, count), ...]} best first, ties broken by lower id"""
+    rows = defaultdict(list)
+    for (food, other), count in pair_counts.items():
+        rows[food].append((other, count))
+    return {
+        food: sorted(others, key=lambda item: (-item[1], item[0]))[:k]
+        for food, others in rows.items()
+    }
+
+
+def _related_rows(top):
+    return [
+        RelatedFood(food_id=food, related_id=other, rank=rank, together_count=count)
+        for food, others in top.items()
+        for rank, (other, count) in enumerate(others, start=1)
+    ]
+
+
+def rebuild_recommendations(k=RELATED_TOP_K):
+    """Recompute the co-occurrence matrix and top-k table from all counted orders"""
+    with transaction.atomic():
+        orders = Order.objects.filter(status__in=COUNTED_STATUSES)
+        # One row per food per order, whatever the quantity
+        rows = list(
+            OrderItem.objects
+            .filter(order__in=orders)
+            .values_list('order_id', 'food_id')
+            .distinct()
+            .order_by('order_id', 'food_id')
+        )
+        order_ids = [order_id for order_id, _ in rows]
+        food_ids = [food_id for _, food_id in rows]
+        pair_counts = count_pairs(order_ids, food_ids)
+
+        FoodPairCount.objects.all().delete()
+        RelatedFood.objects.all().delete()
+        FoodPairCount.objects.bulk_create(
+            [
+                FoodPairCount(food_id=food, other_id=other, count=count)
+                for (food, other), count in pair_counts.items()
+            ],
+            batch_size=1000,
+        )
+        RelatedFood.objects.bulk_create(_related_rows(top_related(pair_counts, k)), batch_size=1000)
+
+        orders.update(counted_in_pairs=True)
+        Order.objects.exclude(status__in=COUNTED_STATUSES).update(counted_in_pairs=False)
+
+    transaction.on_commit(bump_related_version)
+    return len(pair_counts)
+
+
+# ======================
+# INCREMENTAL UPDATES
+# ======================
+def record_order_pairs(order, k=RELATED_TOP_K):
+    """
+    Add one accepted order to the co-occurrence matrix and refresh the
+    top-k rows of the foods in it. Safe to call more than once.
+    """
+    with transaction.atomic():
+        claimed = Order.objects.filter(
+            pk=order.pk, status__in=COUNTED_STATUSES, counted_in_pairs=False
+        ).update(counted_in_pairs=True)
+        if not claimed:
+            return False
+        order.counted_in_pairs = True
+
+        food_ids = sorted(set(
+            OrderItem.objects.filter(order=order).values_list('food_id', flat=True)
+        ))
+        if len(food_ids) < 2:
+            return True
+
+        for food, other in permutations(food_ids, 2):
+            FoodPairCount.objects.get_or_create(food_id=food, other_id=other)
+            FoodPairCount.objects.filter(food_id=food, other_id=other).update(
+                count=F('count') + 1
+            )
+
+        pair_counts = {
+            (food, other): count
+            for food, other, count in FoodPairCount.objects
+            .filter(food_id__in=food_ids)
+            .values_list('food_id', 'other_id', 'count')
+        }
+        RelatedFood.objects.filter(food_id__in=food_ids).delete()
+        RelatedFood.objects.bulk_create(_related_rows(top_related(pair_counts, k)))
+
+    transaction.on_commit(bump_related_version)
+    return True
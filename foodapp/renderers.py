@@ -0,0 +1,163 @@
+"""
+API renderers and parsers.
+
+JSON is backed by orjson when it is installed, falling back to DRF's stdlib
+implementation otherwise. settings.API_JSON_BACKEND picks the backend:
+"auto" (orjson if importable), "orjson" or "stdlib". Types orjson doesn't
+handle natively, and datetimes, go through DRF's own JSONEncoder so the
+output matches the stdlib renderer.
+
+MessagePack (application/msgpack) is offered when msgpack is installed. It
+uses two extension types that clients need an ext hook for:
+  1  Decimal, as its exact string form
+  2  table: a list of dicts sharing the same keys, packed once as
+     [keys, rows] instead of repeating every key per row (order items,
+     order lists, notifications)
+"""
+import codecs
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+_encoder = JSONEncoder()
+
+
+def use_orjson():
+    backend = getattr(settings, 'API_JSON_BACKEND', 'auto')
+    if backend == 'stdlib':
+        return False
+    if backend == 'orjson' and orjson is None:
+        raise ImportError("API_JSON_BACKEND is 'orjson' but orjson is not installed")
+    return orjson is not None
+
+
+def _default(obj):
+    # Decimal, datetime, lazy strings, querysets, ... exactly as DRF does
+    return _encoder.default(obj)
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not use_orjson():
+            return super().render(data, accepted_media_type, renderer_context)
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            # Pretty printing is for humans; leave it to the stdlib path
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escape line/paragraph separators like JSONRenderer does, so the
+        # output stays valid inside <script> tags
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not use_orjson() or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+# ======================
+# MESSAGEPACK
+# ======================
+MSGPACK_EXT_DECIMAL = 1
+MSGPACK_EXT_TABLE = 2
+
+
+def _msgpack_default(obj):
+    if isinstance(obj, Decimal):
+        return msgpack.ExtType(MSGPACK_EXT_DECIMAL, str(obj).encode('ascii'))
+    return _encoder.default(obj)
+
+
+def _msgpack_packb(data):
+    return msgpack.packb(data, default=_msgpack_default, use_bin_type=True)
+
+
+def _compact(value):
+    """Swap lists of same-keyed dicts for table extension values"""
+    if isinstance(value, dict):
+        return {key: _compact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if len(value) > 1 and all(isinstance(item, dict) for item in value):
+            keys = list(value[0])
+            if all(len(item) == len(keys) and list(item) == keys for item in value):
+                rows = [[_compact(item[key]) for key in keys] for item in value]
+                return msgpack.ExtType(MSGPACK_EXT_TABLE, _msgpack_packb([keys, rows]))
+        return [_compact(item) for item in value]
+    return value
+
+
+def _msgpack_ext_hook(code, data):
+    if code == MSGPACK_EXT_DECIMAL:
+        # ValueError (which the parser reports as a 400) for anything that
+        # isn't a finite decimal
+        try:
+            value = Decimal(data.decode('ascii'))
+        except InvalidOperation:
+            raise ValueError('invalid decimal extension value')
+        if not value.is_finite():
+            raise ValueError('invalid decimal extension value')
+        return value
+    if code == MSGPACK_EXT_TABLE:
+        keys, rows = msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False)
+        return [dict(zip(keys, row)) for row in rows]
+    return msgpack.ExtType(code, data)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return _msgpack_packb(_compact(data))
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), ext_hook=_msgpack_ext_hook, raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
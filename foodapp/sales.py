@@ -0,0 +1,101 @@
+"""
+Incrementally maintained sales rollup behind /api/foods/popular/.
+
+When an order first reaches "delivered" its items are added to
+FoodSalesRollup (one row per food per day), so bestseller queries read a
+few hundred rollup rows instead of aggregating every OrderItem.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .cache import bump_sales_version
+from .models import FoodSalesRollup, Order, OrderItem
+
+
+def record_delivered_order(order):
+    """
+    Add a delivered order's items to the rollup. Safe to call more than
+    once: the counted_in_sales flag is claimed with a conditional UPDATE,
+    so only the first caller adds anything.
+    """
+    with transaction.atomic():
+        claimed = Order.objects.filter(
+            pk=order.pk, status='delivered', counted_in_sales=False
+        ).update(counted_in_sales=True)
+        if not claimed:
+            return False
+
+        day = timezone.localdate(order.created_at)
+        totals = defaultdict(lambda: [0, Decimal('0')])
+        for food_id, quantity, price in OrderItem.objects.filter(order=order).values_list(
+            'food_id', 'quantity', 'price'
+        ):
+            totals[food_id][0] += quantity
+            totals[food_id][1] += price
+
+        for food_id, (quantity, revenue) in totals.items():
+            FoodSalesRollup.objects.get_or_create(food_id=food_id, day=day)
+            FoodSalesRollup.objects.filter(food_id=food_id, day=day).update(
+                quantity=F('quantity') + quantity,
+                revenue=F('revenue') + revenue,
+            )
+        order.counted_in_sales = True
+
+    transaction.on_commit(bump_sales_version)
+    return True
+
+
+def rebuild_rollup():
+    """Recompute the whole rollup from delivered orders' items"""
+    with transaction.atomic():
+        FoodSalesRollup.objects.all().delete()
+        rows = (
+            OrderItem.objects
+            .filter(order__status='delivered')
+            .annotate(day=TruncDate('order__created_at'))
+            .values('food_id', 'day')
+            .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('price'))
+            .order_by()
+        )
+        rollups = [
+            FoodSalesRollup(
+                food_id=row['food_id'],
+                day=row['day'],
+                quantity=row['total_quantity'],
+                revenue=row['total_revenue'],
+            )
+            for row in rows
+        ]
+        FoodSalesRollup.objects.bulk_create(rollups, batch_size=1000)
+        Order.objects.filter(status='delivered').update(counted_in_sales=True)
+        Order.objects.exclude(status='delivered').update(counted_in_sales=False)
+
+    transaction.on_commit(bump_sales_version)
+    return len(rollups)
+
+
+def popular_foods(foods, days, limit):
+    """
+    Best sellers among the foods queryset over the last `days` days, as
+    (food, quantity, revenue) tuples, most sold first.
+    """
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals = list(
+        FoodSalesRollup.objects
+        .filter(day__gte=since, food__in=foods.values('pk'))
+        .values('food_id')
+        .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+        .order_by('-total_quantity', 'food_id')[:limit]
+    )
+    food_map = foods.in_bulk([row['food_id'] for row in totals])
+    return [
+        (food_map[row['food_id']], row['total_quantity'], row['total_revenue'])
+        for row in totals
+        if row['food_id'] in food_map
+    ]
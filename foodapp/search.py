@@ -0,0 +1,159 @@
+"""
+Full-text search over Food.name and Food.description.
+
+PostgreSQL keeps a generated tsvector column with a GIN index. SQLite (local
+and dev) keeps an FTS5 shadow table in sync with triggers. Both are installed
+idempotently after every migrate, because SQLite drops a table's triggers
+whenever a migration rebuilds it. Other databases fall back to icontains.
+"""
+import re
+
+from django.db import DatabaseError, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+FOOD_TABLE = 'foodapp_food'
+FTS_TABLE = 'foodapp_food_fts'
+SEARCH_CONFIG = 'english'
+
+POSTGRES_SETUP = [
+    f"""
+    ALTER TABLE {FOOD_TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS food_search_vector_gin
+    ON {FOOD_TABLE} USING GIN (search_vector)
+    """,
+]
+
+SQLITE_TABLE = f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='{FOOD_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+"""
+
+SQLITE_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {FOOD_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+    f'{FTS_TABLE}_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {FOOD_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+    """,
+    f'{FTS_TABLE}_au': f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {FOOD_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+    """,
+}
+
+# Per database alias: does the FTS5 table exist?
+_fts_ready = {}
+
+
+def ensure_search_index(using='default'):
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for sql in POSTGRES_SETUP:
+                cursor.execute(sql)
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f'{FTS_TABLE}_%'],
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            try:
+                cursor.execute(SQLITE_TABLE)
+            except DatabaseError:
+                # SQLite built without FTS5; search falls back to icontains
+                _fts_ready[using] = False
+                return
+            for sql in SQLITE_TRIGGERS.values():
+                cursor.execute(sql)
+            if set(SQLITE_TRIGGERS) - existing:
+                # Rows may have changed while the triggers were missing
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+            _fts_ready[using] = True
+
+
+def _sqlite_fts_ready(connection):
+    if connection.alias not in _fts_ready:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            _fts_ready[connection.alias] = cursor.fetchone() is not None
+    return _fts_ready[connection.alias]
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query)
+
+
+def postgres_tsquery(terms):
+    """
+    to_tsquery() input matching what the FTS5 path does: every term must
+    match, each as a prefix. Terms are \w+ runs, so quoting them is enough
+    to keep tsquery operators out.
+    """
+    return ' & '.join("'%s':*" % term for term in terms)
+
+
+def search_foods(queryset, query):
+    """
+    Filter a Food queryset down to rows matching query, annotated with a
+    `rank` where higher is a better match.
+    """
+    terms = search_terms(query)
+    if not terms:
+        # Callers order by rank even when nothing can match
+        return queryset.none().annotate(rank=Value(0.0, output_field=FloatField()))
+
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'postgresql':
+        # Prefix matching like FTS5 below, so dev and production agree
+        tsquery = f"to_tsquery('{SEARCH_CONFIG}', %s)"
+        prefixes = postgres_tsquery(terms)
+        return queryset.filter(
+            RawSQL(f'{FOOD_TABLE}.search_vector @@ {tsquery}', [prefixes], output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(f'ts_rank({FOOD_TABLE}.search_vector, {tsquery})', [prefixes], output_field=FloatField())
+        )
+
+    if connection.vendor == 'sqlite' and _sqlite_fts_ready(connection):
+        # Quote every term so user input can't hit FTS5 query syntax, and
+        # match prefixes so partial words still find dishes.
+        match = ' '.join('"%s"*' % term.replace('"', '""') for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            # bm25() is lower-is-better, so flip it
+            rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = {FOOD_TABLE}.id',
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(description__icontains=term)
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
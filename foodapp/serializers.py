@@ -1,8 +1,141 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Food, Order, OrderItem, Profile, Inventory, Notification
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from .models import Food, MenuEntry, Order, OrderItem, Profile, Inventory, Notification
+from .stock import OutOfStock, reserve_stock
 from django.contrib.auth.models import User
 
-class RegisterSerializer(serializers.ModelSerializer):
+
+# ======================
+# SPARSE FIELDSETS
+# ======================
+def split_param(request, name):
+    """Comma separated query param as a set: ?fields=id,status"""
+    if request is None:
+        return set()
+    # DRF Request or a plain Django HttpRequest
+    params = getattr(request, 'query_params', None) or request.GET
+    values = params.getlist(name)
+    return {item.strip() for value in values for item in value.split(',') if item.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    ?fields=id,status limits the representation to those fields, and
+    ?expand=customer swaps a field for the nested serializer declared in
+    Meta.expandable_fields. Only the top-level serializer reads the query
+    params, so nested and expanded serializers render in full.
+
+    optimize_queryset() turns the same selection into only() /
+    select_related() / prefetch_related() calls, so relations the client
+    didn't ask for are never loaded. Fields whose data the ORM can't infer
+    from their source (methods, properties) list their model fields in
+    Meta.field_sources.
+    """
+
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_root():
+            return fields
+
+        request = self.context.get('request')
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        for name in split_param(request, 'expand') & set(expandable):
+            serializer_class = expandable[name]
+            fields[name] = serializer_class(read_only=True, many=False)
+
+        requested = split_param(request, 'fields')
+        if requested:
+            fields = {name: field for name, field in fields.items() if name in requested}
+        return fields
+
+    @classmethod
+    def optimize_queryset(cls, queryset, request):
+        serializer = cls(context={'request': request})
+        plan = {
+            'only': {queryset.model._meta.pk.name},
+            'select': set(),
+            'prefetch': set(),
+            'expanded': set(),
+        }
+        _plan_fields(queryset.model, serializer, plan)
+
+        # An expanded relation renders every column, so don't prune it
+        only = {
+            name for name in plan['only']
+            if name.split('__')[0] not in plan['expanded'] or '__' not in name
+        }
+        queryset = queryset.only(*only)
+        if plan['select']:
+            queryset = queryset.select_related(*plan['select'])
+        if plan['prefetch']:
+            queryset = queryset.prefetch_related(*plan['prefetch'])
+        return queryset
+
+
+def _plan_fields(model, serializer, plan, prefix='', in_prefetch=False):
+    """
+    Collect the ORM work needed to render serializer's fields for model.
+    Columns are only pruned at the top level; nested levels just add the
+    joins and prefetches they need.
+    """
+    top_level = not prefix
+    field_sources = getattr(getattr(serializer, 'Meta', None), 'field_sources', {})
+    reverse = {rel.get_accessor_name(): rel for rel in model._meta.related_objects}
+
+    for name, field in serializer.fields.items():
+        if name in field_sources:
+            sources = field_sources[name]
+        elif field.source == '*':
+            continue
+        else:
+            sources = [field.source.replace('.', '__')]
+
+        for source in sources:
+            head, _, rest = source.partition('__')
+            path = prefix + head
+
+            if head in reverse:
+                # Reverse FK (orderitem_set): prefetch, then recurse into the
+                # nested serializer for its own relations
+                plan['prefetch'].add(path)
+                child = getattr(field, 'child', None)
+                if isinstance(child, serializers.ModelSerializer):
+                    _plan_fields(reverse[head].related_model, child, plan, path + '__', True)
+                continue
+
+            try:
+                model_field = model._meta.get_field(head)
+            except FieldDoesNotExist:
+                continue
+            if top_level:
+                plan['only'].add(head)
+
+            if not model_field.is_relation or not (rest or isinstance(field, serializers.Serializer)):
+                continue
+
+            relation = prefix + source.rsplit('__', 1)[0] if rest else path
+            plan['prefetch' if in_prefetch else 'select'].add(relation)
+            if rest:
+                # customer.username: join customer, load only what is read
+                if top_level:
+                    plan['only'].add(source)
+            else:
+                # Expanded relation: render the nested serializer in full
+                if top_level:
+                    plan['expanded'].add(head)
+                _plan_fields(model_field.related_model, field, plan, path + '__', in_prefetch)
+
+
+class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
     email = serializers.EmailField(required=True)
     first_name = serializers.CharField(required=True)
@@ -10,21 +143,21 @@ class RegisterSerializer(serializers.ModelSerializer):
     phone = serializers.CharField(required=False, default='')
     address = serializers.CharField(required=False, default='')
 
-    class Meta:
-        model = User
-        fields = ['username', 'password', 'email', 'first_name', 'last_name', 'phone', 'address']
-
-    def validate_email(self, value):
-        if User.objects.filter(email__iexact=value).exists():
-            raise serializers.ValidationError("A user with this email already exists.")
-        return value
-
-    def validate_username(self, value):
-        if User.objects.filter(username__iexact=value).exists():
-            raise serializers.ValidationError("A user with this username already exists.")
-        return value
-
-    def create(self, validated_data):
+    class Meta:
+        model = User
+        fields = ['username', 'password', 'email', 'first_name', 'last_name', 'phone', 'address']
+
+    def validate_email(self, value):
+        if User.objects.filter(email__iexact=value).exists():
+            raise serializers.ValidationError("A user with this email already exists.")
+        return value
+
+    def validate_username(self, value):
+        if User.objects.filter(username__iexact=value).exists():
+            raise serializers.ValidationError("A user with this username already exists.")
+        return value
+
+    def create(self, validated_data):
         # Always set role to 'customer' for public registration
         # Restaurant staff accounts are created internally by system developers
         role = 'customer'
@@ -33,11 +166,11 @@ class RegisterSerializer(serializers.ModelSerializer):
         phone = validated_data.pop('phone', '')
         address = validated_data.pop('address', '')
         
-        user = User.objects.create_user(
-            username=validated_data['username'],
-            password=validated_data['password'],
-            email=validated_data['email'].lower()
-        )
+        user = User.objects.create_user(
+            username=validated_data['username'],
+            password=validated_data['password'],
+            email=validated_data['email'].lower()
+        )
         
         # Create or update Profile with the selected role and additional fields
         profile, created = Profile.objects.get_or_create(user=user, defaults={
@@ -57,26 +190,102 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class FoodSerializer(serializers.ModelSerializer):
+class UserSummarySerializer(serializers.ModelSerializer):
+    """Nested user for ?expand=customer (seen by the customer and staff)"""
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+
+class RestaurantSummarySerializer(serializers.ModelSerializer):
+    """Nested restaurant for ?expand=restaurant on the public menu: no account details"""
+    name = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'name']
+        field_sources = {'name': ['profile__first_name', 'profile__last_name']}
+
+    def get_name(self, obj):
+        try:
+            profile = obj.profile
+        except Profile.DoesNotExist:
+            return ''
+        return f'{profile.first_name} {profile.last_name}'.strip()
+
+
+class FoodSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # Return full image URL for frontend display
     image = serializers.SerializerMethodField()
+    # Resized WebP/JPEG copies of image, per variant (see foodapp.images)
+    srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = Food
-        fields = ['id', 'name', 'description', 'price', 'stock', 'category', 'image', 'available', 'restaurant']
+        fields = ['id', 'name', 'description', 'price', 'stock', 'category', 'image', 'srcset', 'available', 'restaurant']
         read_only_fields = ['restaurant']
+        expandable_fields = {'restaurant': RestaurantSummarySerializer}
+        field_sources = {'image': ['image'], 'srcset': ['image_variants']}
+        # Fast list path (foodapp.fastlist): raw column value -> output
+        fast_mappers = {'image': 'image_url', 'srcset': 'srcset_urls'}
     
     def get_image(self, obj):
         """Return full image URL for frontend display"""
-        if obj.image:
-            # Build full URL from request context
+        return self.image_url(obj.image.name if obj.image else None)
+
+    def image_url(self, name):
+        if name:
+            url = Food._meta.get_field('image').storage.url(name)
+            # Build full URL from request context (bucket URLs already are)
             request = self.context.get('request')
             if request:
-                return request.build_absolute_uri(obj.image.url)
-            # Fallback: if no request context, construct URL manually
-            return f"/media/{obj.image.name}"
+                return request.build_absolute_uri(url)
+            return url
         return None
 
+    def get_srcset(self, obj):
+        return self.srcset_urls(obj.image_variants)
+
+    def srcset_urls(self, variants):
+        """{"thumb": {"width": 160, "height": 120, "webp": url, "jpeg": url}, ...}"""
+        return {
+            variant: {
+                key: self.image_url(value) if key in ('webp', 'jpeg') else value
+                for key, value in entry.items()
+            }
+            for variant, entry in (variants or {}).items()
+        }
+
+    def validate(self, attrs):
+        if 'available' in attrs:
+            # Staff decided; a cancelled order mustn't undo it
+            attrs['sold_out'] = False
+        return attrs
+
+
+class MenuEntrySerializer(FoodSerializer):
+    """Renders public menu rows (MenuEntry) exactly like FoodSerializer renders Food"""
+    id = serializers.IntegerField(source='food_id', read_only=True)
+
+    class Meta(FoodSerializer.Meta):
+        model = MenuEntry
+        read_only_fields = FoodSerializer.Meta.fields
+
+
+class FoodBulkUpdateSerializer(serializers.ModelSerializer):
+    """One partial update in POST /api/foods/bulk_update/"""
+    id = serializers.IntegerField()
+
+    class Meta:
+        model = Food
+        fields = ['id', 'price', 'stock', 'available']
+        extra_kwargs = {name: {'required': False} for name in ['price', 'stock', 'available']}
+
+    def validate(self, attrs):
+        if len(attrs) < 2:
+            raise serializers.ValidationError("Give at least one of price, stock or available")
+        return attrs
+
 
 class OrderItemSerializer(serializers.ModelSerializer):
     food_name = serializers.CharField(source='food.name', read_only=True)
@@ -93,7 +302,7 @@ class OrderItemCreateSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=1)
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True, source='orderitem_set')
     customer_username = serializers.CharField(source='customer.username', read_only=True)
     customer_email = serializers.CharField(source='customer.email', read_only=True)
@@ -102,6 +311,7 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['id', 'customer', 'customer_username', 'customer_email', 'items', 'status', 'total_price', 'delivery_address', 'created_at', 'updated_at']
         read_only_fields = ['customer', 'total_price', 'created_at', 'updated_at']
+        expandable_fields = {'customer': UserSummarySerializer}
 
 
 class OrderCreateSerializer(serializers.Serializer):
@@ -114,54 +324,71 @@ class OrderCreateSerializer(serializers.Serializer):
         if not value or len(value) == 0:
             raise serializers.ValidationError("At least one item is required")
         
-        food_ids = [item['food'] for item in value]
-        existing_foods = Food.objects.filter(id__in=food_ids, available=True).values_list('id', flat=True)
-        missing_foods = set(food_ids) - set(existing_foods)
+        # One query; create() prices the order from these same rows
+        food_ids = {item['food'] for item in value}
+        self.foods = Food.objects.filter(available=True).in_bulk(food_ids)
+        missing_foods = food_ids - set(self.foods)
         
         if missing_foods:
-            raise serializers.ValidationError(f"Food items not available: {list(missing_foods)}")
+            raise serializers.ValidationError(f"Food items not available: {sorted(missing_foods)}")
+
+        # Fail fast on what we just read; reserve_stock() has the final word
+        short = [
+            food_id for food_id, quantity in self.quantities(value).items()
+            if self.foods[food_id].stock is not None and self.foods[food_id].stock < quantity
+        ]
+        if short:
+            raise serializers.ValidationError(f"Not enough stock for: {short}")
         return value
+
+    def quantities(self, items):
+        """{food id: total quantity} across the order's items"""
+        totals = {}
+        for item in items:
+            totals[item['food']] = totals.get(item['food'], 0) + item['quantity']
+        return totals
     
     def create(self, validated_data):
+        """
+        Place the order in one transaction: one Order insert, one bulk
+        insert for its items (priced in Decimal) and one conditional UPDATE
+        reserving their stock.
+        """
         items_data = validated_data.pop('items')
         delivery_address = validated_data.pop('delivery_address')
         status = validated_data.pop('status', 'pending')
         customer = self.context['request'].user
         
-        # Calculate total price
-        total_price = 0
         order_items = []
-        
+        total_price = Decimal('0')
         for item_data in items_data:
-            food = Food.objects.get(id=item_data['food'])
+            food = self.foods[item_data['food']]
             quantity = item_data['quantity']
-            item_total = float(food.price) * quantity
+            item_total = food.price * quantity
             total_price += item_total
-            
-            order_items.append({
-                'food': food,
-                'quantity': quantity,
-                'price': item_total
-            })
-        
-        # Create order
-        order = Order.objects.create(
-            customer=customer,
-            delivery_address=delivery_address,
-            status=status,
-            total_price=total_price
-        )
+            order_items.append(OrderItem(food=food, quantity=quantity, price=item_total))
         
-        # Create order items - THIS IS THE CRITICAL PART
-        print(f"Creating order #{order.id} with {len(order_items)} items")
-        for item_data in order_items:
-            order_item = OrderItem.objects.create(
-                order=order,
-                food=item_data['food'],
-                quantity=item_data['quantity'],
-                price=item_data['price']
-            )
-            print(f"  - Created item: {item_data['food'].name} x {item_data['quantity']}")
+        # An order placed already cancelled takes nothing
+        reserve = status != 'cancelled'
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    customer=customer,
+                    delivery_address=delivery_address,
+                    status=status,
+                    total_price=total_price,
+                    stock_reserved=reserve
+                )
+                for order_item in order_items:
+                    order_item.order = order
+                # bulk_create skips OrderItem's post_save, but Order's post_save
+                # already invalidates this order's fragment on commit
+                OrderItem.objects.bulk_create(order_items)
+                # Last, so the reserved rows stay locked only until commit
+                if reserve:
+                    reserve_stock(self.foods, self.quantities(items_data))
+        except OutOfStock as exc:
+            raise serializers.ValidationError({'items': [f"Not enough stock for: {exc.food_ids}"]})
         
         return order
 
@@ -195,17 +422,18 @@ class InventoryCreateSerializer(serializers.ModelSerializer):
 
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'type', 'message', 'is_read', 'created_at', 'order']
         read_only_fields = ['id', 'created_at']
+        expandable_fields = {'order': OrderSerializer}
 
 
 # ======================
 # PROFILE SERIALIZERS
 # ======================
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     full_name = serializers.ReadOnlyField()
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
@@ -214,6 +442,7 @@ class ProfileSerializer(serializers.ModelSerializer):
         model = Profile
         fields = ['id', 'username', 'email', 'role', 'first_name', 'last_name', 'full_name', 'phone', 'address']
         read_only_fields = ['id', 'username', 'email', 'role', 'full_name']
+        field_sources = {'full_name': ['first_name', 'last_name', 'user__username']}
 
 
 class ProfileUpdateSerializer(serializers.ModelSerializer):
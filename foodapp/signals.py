@@ -1,7 +1,14 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_migrate
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Profile
+from .models import Profile, Food, Order, OrderItem
+from .cache import bump_menu_version, bump_profile_version, bump_row_version
+from .search import ensure_search_index
+from .menu import refresh_menu_entries
+from .sales import record_delivered_order
+from .recommendations import COUNTED_STATUSES, record_order_pairs
+from .stock import release_stock
 
 
 @receiver(post_save, sender=User)
@@ -17,3 +24,82 @@ def save_user_profile(sender, instance, **kwargs):
     except Profile.DoesNotExist:
         Profile.objects.create(user=instance, role='customer')
 
+
+@receiver(post_save, sender=Food)
+@receiver(post_delete, sender=Food)
+def invalidate_menu_cache(sender, instance, **kwargs):
+    # Bump after commit so a concurrent read can't cache the old rows
+    # under the new version.
+    restaurant_id = instance.restaurant_id
+    transaction.on_commit(lambda: bump_menu_version(restaurant_id))
+    _invalidate_fragment(Food, instance.pk)
+
+
+@receiver(post_save, sender=Food)
+def refresh_menu_entry(sender, instance, raw=False, **kwargs):
+    # Same transaction as the Food write; deletes cascade to the entry
+    if not raw:
+        refresh_menu_entries([instance.pk])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Profile)
+def invalidate_profile_etag(sender, instance, **kwargs):
+    user_id = instance.id if sender is User else instance.user_id
+    transaction.on_commit(lambda: bump_profile_version(user_id))
+
+
+def _invalidate_fragment(model, pk):
+    label = model._meta.label_lower
+    transaction.on_commit(lambda: bump_row_version(label, pk))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_fragment(sender, instance, **kwargs):
+    _invalidate_fragment(Order, instance.pk)
+
+
+@receiver(post_save, sender=Order)
+def count_delivered_order(sender, instance, **kwargs):
+    # After commit, so the order's items are all in place
+    if instance.status == 'delivered' and not instance.counted_in_sales:
+        transaction.on_commit(lambda: record_delivered_order(instance))
+
+
+@receiver(post_save, sender=Order)
+def count_order_pairs(sender, instance, **kwargs):
+    if instance.status in COUNTED_STATUSES and not instance.counted_in_pairs:
+        transaction.on_commit(lambda: record_order_pairs(instance))
+
+
+@receiver(post_save, sender=Order)
+def release_cancelled_stock(sender, instance, **kwargs):
+    # Rejected or cancelled: the dishes are back on offer
+    if instance.status == 'cancelled' and instance.stock_reserved:
+        release_stock(instance)
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def invalidate_order_item_fragment(sender, instance, **kwargs):
+    _invalidate_fragment(Order, instance.order_id)
+
+
+# User fields order fragments render
+ORDER_USER_FIELDS = {'username', 'email'}
+
+
+@receiver(post_save, sender=User)
+def invalidate_customer_order_fragments(sender, instance, created, update_fields=None, **kwargs):
+    # Order fragments carry their customer's row version, so one bump
+    # covers all of them. Logins save only last_login and skip this.
+    if created or (update_fields is not None and not ORDER_USER_FIELDS & set(update_fields)):
+        return
+    _invalidate_fragment(User, instance.pk)
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using, **kwargs):
+    if sender.name == 'foodapp':
+        ensure_search_index(using)
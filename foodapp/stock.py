@@ -0,0 +1,118 @@
+"""
+Stock reservation for orders.
+
+Placing an order takes its dishes out of stock with a single conditional
+UPDATE inside the order's transaction:
+
+    UPDATE foodapp_food SET available = (stock != CASE id WHEN ... END),
+                            stock = stock - CASE id WHEN ... END
+    WHERE id IN (...) AND available
+          AND (stock IS NULL OR stock >= CASE id WHEN ... END)
+
+The database checks and decrements each row in one step, so two orders for
+the last portion can't both succeed, and no stock value is read into Python
+and written back. Dishes that reach zero go off the menu in the same
+statement. If fewer rows match than dishes were ordered, the reservation is
+rolled back and the order fails. Dishes with no stock count (NULL: the
+restaurant doesn't track it) always match and stay NULL.
+
+Cancelling an order (reject, or status set to "cancelled") gives its stock
+back exactly once; Order.stock_reserved records whether it still holds any.
+Dishes that selling out took off the menu (Food.sold_out) go back on it;
+dishes staff took off stay off.
+
+Queryset update() skips Food's signals, so the menu read model, row
+versions and menu versions are refreshed here explicitly.
+"""
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from .cache import bump_menu_version, bump_row_version
+from .menu import refresh_menu_entries
+from .models import Food, Order, OrderItem
+
+
+class OutOfStock(Exception):
+    def __init__(self, food_ids):
+        super().__init__(food_ids)
+        self.food_ids = food_ids
+
+
+def _per_food(quantities):
+    return Case(
+        *[When(id=food_id, then=Value(quantity)) for food_id, quantity in quantities.items()],
+        output_field=PositiveIntegerField(),
+    )
+
+
+def _stock_changed(food_ids, restaurant_ids):
+    refresh_menu_entries(food_ids)
+    label = Food._meta.label_lower
+    for food_id in food_ids:
+        transaction.on_commit(lambda food_id=food_id: bump_row_version(label, food_id))
+    for restaurant_id in restaurant_ids:
+        transaction.on_commit(lambda restaurant_id=restaurant_id: bump_menu_version(restaurant_id))
+
+
+def reserve_stock(foods, quantities):
+    """
+    Take quantities ({food id: count}) out of the stock of foods ({food id:
+    Food}, for their restaurants). Call inside the order's transaction.
+    Raises OutOfStock naming the dishes that were short; nothing is
+    reserved then.
+    """
+    food_ids = sorted(quantities)
+    needed = _per_food(quantities)
+    with transaction.atomic():
+        reserved = Food.objects.filter(
+            Q(stock__isnull=True) | Q(stock__gte=needed), id__in=food_ids, available=True
+        ).update(
+            # Before stock, so even left-to-right SET evaluation sees the old value
+            available=Case(When(stock=needed, then=Value(False)), default=Value(True)),
+            sold_out=Case(When(stock=needed, then=Value(True)), default=Value(False)),
+            stock=F('stock') - needed,
+            updated_at=timezone.now(),
+        )
+        if reserved != len(food_ids):
+            transaction.set_rollback(True)
+        else:
+            _stock_changed(food_ids, {foods[food_id].restaurant_id for food_id in food_ids})
+            return
+
+    # Only for the error message; the reservation is already undone
+    current = Food.objects.filter(id__in=food_ids).values_list('id', 'stock', 'available')
+    raise OutOfStock(sorted(
+        food_id for food_id, stock, available in current
+        if not available or (stock is not None and stock < quantities[food_id])
+    ) or food_ids)
+
+
+def release_stock(order):
+    """
+    Put a cancelled order's quantities back in stock and sold-out dishes
+    back on the menu. Returns False if the order holds no reservation
+    (never made, or already released).
+    """
+    with transaction.atomic():
+        # Claim the release so concurrent cancels can't both give stock back
+        if not Order.objects.filter(pk=order.pk, stock_reserved=True).update(stock_reserved=False):
+            return False
+        quantities = dict(
+            OrderItem.objects.filter(order_id=order.pk)
+            .values('food_id')
+            .annotate(quantity=Sum('quantity'))
+            .values_list('food_id', 'quantity')
+        )
+        if quantities:
+            food_ids = sorted(quantities)
+            Food.all_objects.filter(id__in=food_ids).update(
+                stock=F('stock') + _per_food(quantities),
+                available=Case(When(sold_out=True, then=Value(True)), default=F('available')),
+                sold_out=Value(False),
+                updated_at=timezone.now(),
+            )
+            restaurant_ids = set(Food.all_objects.filter(id__in=food_ids).values_list('restaurant_id', flat=True))
+            _stock_changed(food_ids, restaurant_ids)
+    order.stock_reserved = False
+    return True
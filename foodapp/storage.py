@@ -0,0 +1,264 @@
+"""
+Content-addressed storage for food images.
+
+Files are named by the SHA-256 of their bytes, keeping the directory the
+caller asked for: foods/Pizza.jpg is stored as foods/<sha256>.jpg.
+Identical uploads therefore share one file, re-uploading never leaves a
+Pizza_x8Kq2.jpg copy behind, and a URL's content never changes, so it can
+be cached forever (see IMMUTABLE_NAME).
+
+Nothing is deleted when a Food stops pointing at a file, since another Food
+may share it; foodapp.images.collect_garbage() removes files no Food
+references anymore.
+
+settings.MEDIA_STORAGE picks where the files live:
+
+- "local": MEDIA_ROOT on this machine's disk (ContentAddressedStorage).
+- "s3": an S3-compatible bucket - AWS, MinIO, R2 - via boto3
+  (ContentAddressedS3Storage), so any number of web processes share them.
+
+Both backends also hand out presigned uploads (presigned_upload()): a form
+POST the client sends straight to storage, never touching a web worker.
+The local backend's stand-in for the bucket endpoint is
+foodapp.media.receive_direct_upload, which checks the same policy S3 would.
+"""
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+from django.urls import reverse
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+
+# Basename of a content-addressed file: <64 hex chars>[.ext]
+IMMUTABLE_NAME = re.compile(r'^[0-9a-f]{64}(\.[0-9a-z]+)?$')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+def is_content_addressed(name):
+    return bool(IMMUTABLE_NAME.match(os.path.basename(name)))
+
+
+def object_headers(name):
+    """Object metadata for a stored file: its type and, if hashed, cache forever"""
+    headers = {'ContentType': mimetypes.guess_type(name)[0] or 'application/octet-stream'}
+    if is_content_addressed(name):
+        headers['CacheControl'] = 'public, max-age=31536000, immutable'
+    return headers
+
+
+class ContentAddressedMixin:
+    """Name files by their content; put_object() writes an exact name"""
+
+    def content_name(self, name, content):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, content_hash(content) + extension).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Same bytes are already stored. Freshen the file so garbage
+            # collection's grace period covers this new reference too.
+            self.touch(name)
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # The name is the content, so an existing file is the same file
+        return name
+
+    def put_object(self, name, content):
+        """Store content under exactly name (e.g. an incoming upload's key)"""
+        return self._save(name, content)
+
+
+class ContentAddressedStorage(ContentAddressedMixin, FileSystemStorage):
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write beside the target and rename into place, so concurrent
+        # uploads of the same bytes never expose a half-written file
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in content.chunks():
+                    temp_file.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return name
+
+    def touch(self, name):
+        os.utime(self.path(name))
+
+    def presigned_upload(self, key, max_bytes, expires):
+        """
+        Form fields for a direct upload of at most max_bytes to key, shaped
+        like an S3 presigned POST so clients handle both backends alike.
+        """
+        token = signing.dumps({'key': key, 'max_bytes': max_bytes}, salt=DIRECT_UPLOAD_SALT)
+        return {
+            'url': reverse('direct-upload'),
+            'fields': {'key': key, 'token': token},
+            'expires_in': expires,
+        }
+
+
+DIRECT_UPLOAD_SALT = 'foodapp.storage.direct-upload'
+
+
+def check_direct_upload(token, expires):
+    """The {'key', 'max_bytes'} policy a local presigned upload was signed with"""
+    return signing.loads(token, salt=DIRECT_UPLOAD_SALT, max_age=expires)
+
+
+class S3Storage(Storage):
+    """
+    A minimal boto3 storage for one bucket. Works with any S3-compatible
+    service; set endpoint_url for MinIO, R2 and friends.
+    """
+
+    def __init__(self, bucket=None, endpoint_url=None, region=None, public_url=None,
+                 access_key=None, secret_key=None):
+        if boto3 is None:
+            raise ImproperlyConfigured('MEDIA_STORAGE = "s3" needs boto3 installed')
+        self.bucket = bucket or getattr(settings, 'MEDIA_S3_BUCKET', '')
+        if not self.bucket:
+            raise ImproperlyConfigured('MEDIA_STORAGE = "s3" needs MEDIA_S3_BUCKET')
+        self.endpoint_url = endpoint_url or getattr(settings, 'MEDIA_S3_ENDPOINT_URL', None)
+        self.region = region or getattr(settings, 'MEDIA_S3_REGION', None)
+        self.public_url = (public_url or getattr(settings, 'MEDIA_S3_PUBLIC_URL', '')).rstrip('/')
+        # Without explicit keys boto3 falls back to AWS_* env vars / instance roles
+        self.client = boto3.client(
+            's3',
+            endpoint_url=self.endpoint_url,
+            region_name=self.region,
+            aws_access_key_id=access_key or getattr(settings, 'MEDIA_S3_ACCESS_KEY_ID', None),
+            aws_secret_access_key=secret_key or getattr(settings, 'MEDIA_S3_SECRET_ACCESS_KEY', None),
+        )
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as exc:
+            if exc.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode:
+            raise ValueError('S3Storage files are read-only; use save()')
+        body = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024)
+        self.client.download_fileobj(self.bucket, name, body)
+        body.seek(0)
+        return File(body, name)
+
+    def _save(self, name, content):
+        content.seek(0)
+        self.client.upload_fileobj(content, self.bucket, name, ExtraArgs=object_headers(name))
+        return name
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+
+    def touch(self, name):
+        # S3 has no utime; copying an object onto itself resets LastModified
+        self.client.copy_object(
+            Bucket=self.bucket, Key=name, CopySource={'Bucket': self.bucket, 'Key': name},
+            MetadataDirective='REPLACE', **object_headers(name)
+        )
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head['ContentLength']
+
+    def get_modified_time(self, name):
+        head = self._head(name)
+        if head is None:
+            raise FileNotFoundError(name)
+        return head['LastModified']
+
+    def listdir(self, path):
+        prefix = path.rstrip('/') + '/' if path else ''
+        directories, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            for common in page.get('CommonPrefixes', []):
+                directories.append(common['Prefix'][len(prefix):].rstrip('/'))
+            for item in page.get('Contents', []):
+                files.append(item['Key'][len(prefix):])
+        return directories, files
+
+    def url(self, name):
+        if self.public_url:
+            return f'{self.public_url}/{name}'
+        if self.endpoint_url:
+            # Path-style, which every S3-compatible service understands
+            return f'{self.endpoint_url.rstrip("/")}/{self.bucket}/{name}'
+        return f'https://{self.bucket}.s3.amazonaws.com/{name}'
+
+    def presigned_upload(self, key, max_bytes, expires):
+        """A presigned POST: the client sends the file straight to the bucket"""
+        post = self.client.generate_presigned_post(
+            self.bucket, key,
+            Conditions=[
+                ['content-length-range', 1, max_bytes],
+                ['starts-with', '$Content-Type', 'image/'],
+            ],
+            ExpiresIn=expires,
+        )
+        return {'url': post['url'], 'fields': post['fields'], 'expires_in': expires}
+
+
+class ContentAddressedS3Storage(ContentAddressedMixin, S3Storage):
+    pass
+
+
+_food_image_storage = None
+
+
+def food_image_storage():
+    """Storage for Food.image (a callable, so migrations don't embed it)"""
+    global _food_image_storage
+    if _food_image_storage is None:
+        if getattr(settings, 'MEDIA_STORAGE', 'local') == 's3':
+            _food_image_storage = ContentAddressedS3Storage()
+        else:
+            _food_image_storage = ContentAddressedStorage()
+    return _food_image_storage
+
@@ -0,0 +1,92 @@
+"""
+Search-as-you-type suggestions for dish names.
+
+Each worker keeps a prefix trie over the names of available foods. Every
+node stores its best matches already ranked, so a lookup is one walk down
+the prefix with no database access. The trie belongs to one public menu
+version and is rebuilt lazily by the first request that sees a newer one.
+
+Names are indexed from every word start, so "chi" finds "Fried Chicken";
+matches at the start of the name rank first, then alphabetically.
+"""
+import threading
+import unicodedata
+
+from django.conf import settings
+
+from .cache import get_menu_version
+from .models import Food
+
+
+SUGGEST_LIMIT = getattr(settings, 'MENU_SUGGEST_LIMIT', 20)
+
+
+def normalize(text):
+    """Case- and accent-insensitive form used for both names and prefixes"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    return ' '.join(''.join(ch for ch in text if not unicodedata.combining(ch)).split())
+
+
+class _Node:
+    __slots__ = ('children', 'matches')
+
+    def __init__(self):
+        self.children = {}
+        self.matches = {}
+
+
+class PrefixIndex:
+    def __init__(self, foods, limit=SUGGEST_LIMIT):
+        """foods is an iterable of (id, name) pairs"""
+        self.root = _Node()
+        for food_id, name in foods:
+            entry = {'id': food_id, 'name': name}
+            key = normalize(name)
+            starts = [0] + [i + 1 for i, ch in enumerate(key) if ch == ' ']
+            for start in starts:
+                rank = (start > 0, key, food_id)
+                node = self.root
+                for ch in key[start:]:
+                    node = node.children.setdefault(ch, _Node())
+                    best = node.matches.get(food_id)
+                    if best is None or rank < best[0]:
+                        node.matches[food_id] = (rank, entry)
+
+        # Freeze every node's matches into a short ranked list
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            ranked = sorted(node.matches.values(), key=lambda item: item[0])
+            node.matches = [entry for _, entry in ranked[:limit]]
+            stack.extend(node.children.values())
+
+    def lookup(self, prefix, limit=SUGGEST_LIMIT):
+        node = self.root
+        for ch in normalize(prefix):
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return node.matches[:limit]
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """This worker's trie for the current public menu, rebuilt if stale"""
+    global _index, _index_version
+    version = get_menu_version()
+    if _index is not None and _index_version == version:
+        return _index
+    with _lock:
+        if _index is None or _index_version != version:
+            foods = Food.objects.filter(available=True).values_list('id', 'name')
+            _index = PrefixIndex(foods.iterator())
+            _index_version = version
+    return _index
+
+
+def suggest(prefix, limit=SUGGEST_LIMIT):
+    return get_index().lookup(prefix, limit)
@@ -0,0 +1,70 @@
+"""
+Menu delta sync.
+
+A sync cursor is the (updated_at, id) position of the last Food row a client
+has seen, written as "<epoch microseconds>-<id>". Rows are read in that
+order, so a client can page through a large backlog and resume anywhere.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+
+SYNC_PAGE_SIZE = getattr(settings, 'MENU_SYNC_PAGE_SIZE', 500)
+
+# Writes that commit late can carry an updated_at older than rows already
+# handed out. Keep the final cursor this far behind "now" so those rows are
+# picked up on the next sync; clients upsert, so repeats are harmless.
+SYNC_SETTLE = timedelta(seconds=getattr(settings, 'MENU_SYNC_SETTLE_SECONDS', 2))
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_cursor(updated_at, pk):
+    delta = updated_at - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return f'{micros}-{pk}'
+
+
+def decode_cursor(cursor):
+    try:
+        micros, pk = cursor.split('-')
+        updated_at = EPOCH + timedelta(microseconds=int(micros))
+        return updated_at, int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        raise ValidationError({'since': 'Invalid sync cursor.'})
+
+
+def changes_since(queryset, since=None, limit=SYNC_PAGE_SIZE):
+    """
+    Rows from queryset (which must include tombstones) changed after the
+    since cursor. Returns (rows, next_cursor, has_more).
+    """
+    if since:
+        updated_at, pk = decode_cursor(since)
+        queryset = queryset.filter(
+            Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk)
+        )
+    else:
+        # A cold client has nothing to remove
+        queryset = queryset.filter(deleted_at__isnull=True)
+
+    rows = list(queryset.order_by('updated_at', 'id')[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if has_more:
+        last = rows[-1]
+        return rows, encode_cursor(last.updated_at, last.id), has_more
+
+    settled = timezone.now() - SYNC_SETTLE
+    settled_rows = [row for row in rows if row.updated_at <= settled]
+    if settled_rows:
+        last = settled_rows[-1]
+        next_cursor = encode_cursor(last.updated_at, last.id)
+    else:
+        next_cursor = since or ''
+    return rows, next_cursor, has_more
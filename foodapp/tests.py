@@ -1,3 +1,1352 @@
-from django.test import TestCase
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import bulk, recommendations, search, stock
+from .menu import refresh_menu_entries
+from .models import Food, FoodSalesRollup, MenuEntry, Notification, Order, OrderItem, RelatedFood
+from .renderers import FastJSONParser, FastJSONRenderer, MessagePackParser, MessagePackRenderer
+from .serializers import OrderCreateSerializer
+from .storage import ContentAddressedS3Storage
+
+try:
+    from botocore.stub import Stubber
+except ImportError:
+    Stubber = None
+
+
+class MenuCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.restaurant = User.objects.create_user(username='chef', password='pass12345')
+        self.restaurant.profile.role = 'restaurant'
+        self.restaurant.profile.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Food.objects.create(
+                name='Burger', price=Decimal('5000.00'), stock=10, restaurant=self.restaurant
+            )
+
+    def test_list_is_served_from_cache(self):
+        self.client.get('/api/foods/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/foods/')
+        self.assertEqual(response.data[0]['name'], 'Burger')
+
+    def test_save_invalidates_cached_list(self):
+        self.client.get('/api/foods/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.price = Decimal('6500.00')
+            self.food.save()
+        response = self.client.get('/api/foods/')
+        self.assertEqual(response.data[0]['price'], '6500.00')
+
+    def test_delete_invalidates_cached_list(self):
+        self.client.get('/api/foods/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.delete()
+        response = self.client.get('/api/foods/')
+        self.assertEqual(response.data, [])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Food.objects.create(name='Pizza', price=Decimal('12000.00'), stock=5)
+
+    def test_menu_list_returns_304_for_current_etag(self):
+        response = self.client.get('/api/foods/')
+        etag = response['ETag']
+        self.assertIn('must-revalidate', response['Cache-Control'])
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/foods/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.price = Decimal('13000.00')
+            self.food.save()
+        response = self.client.get('/api/foods/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_profile_returns_304_until_profile_changes(self):
+        self.client.force_authenticate(self.user)
+        etag = self.client.get('/api/profile/')['ETag']
+        response = self.client.get('/api/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Accept', response['Vary'])
+
+        # A different representation isn't the one the client holds
+        response = self.client.get('/api/profile/', HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put('/api/profile/', {'phone': '0712345678'}, format='json')
+        response = self.client.get('/api/profile/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['phone'], '0712345678')
+
+
+class FoodListingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        for i in range(5):
+            Food.objects.create(
+                name=f'Dish {i}', price=Decimal(1000 * (i + 1)), stock=i,
+                category='Drink' if i % 2 else 'Main',
+            )
+
+    def test_unpaginated_list_stays_a_plain_array(self):
+        response = self.client.get('/api/foods/')
+        self.assertEqual(len(response.data), 5)
+
+    def test_cursor_pagination_walks_every_row_once(self):
+        names = []
+        url = '/api/foods/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            names.extend(food['name'] for food in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(names, [f'Dish {i}' for i in range(4, -1, -1)])
+
+    def test_filters(self):
+        response = self.client.get('/api/foods/?category=Drink&min_price=2500&in_stock=true')
+        self.assertEqual([food['name'] for food in response.data], ['Dish 3'])
+
+        response = self.client.get('/api/foods/?max_price=abc')
+        self.assertEqual(response.status_code, 400)
+
+        for query in ('min_price=NaN', 'max_price=-Infinity', 'restaurant=99999999999999999999999'):
+            self.assertEqual(self.client.get(f'/api/foods/?{query}').status_code, 400, query)
+
+
+class FoodSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Food.objects.create(name='Chocolate Sorbet', description='Dark cocoa', price=Decimal('4000'))
+        Food.objects.create(name='Cheese Pizza', description='Topped with chocolate flakes', price=Decimal('9000'))
+        Food.objects.create(name='Fried Chips', price=Decimal('3000'))
+
+    def test_search_ranks_name_matches_first(self):
+        response = self.client.get('/api/foods/search/?q=chocolate')
+        names = [food['name'] for food in response.data['results']]
+        self.assertEqual(names, ['Chocolate Sorbet', 'Cheese Pizza'])
+
+    def test_search_index_follows_updates(self):
+        chips = Food.objects.get(name='Fried Chips')
+        chips.name = 'Masala Chips'
+        chips.save()
+        response = self.client.get('/api/foods/search/?q=masala')
+        self.assertEqual(response.data['count'], 1)
+
+    def test_search_handles_prefixes_and_punctuation(self):
+        response = self.client.get('/api/foods/search/?q="choc')
+        self.assertEqual(response.data['count'], 2)
+
+    def test_punctuation_only_query_matches_nothing(self):
+        for query in ('"', '!!'):
+            response = self.client.get('/api/foods/search/', {'q': query})
+            self.assertEqual(response.status_code, 200, query)
+            self.assertEqual(response.data['count'], 0)
+
+    def test_postgres_query_matches_every_term_as_a_prefix(self):
+        # The FTS5 path above does the same; PostgreSQL isn't available here
+        terms = search.search_terms('choc  piz!')
+        self.assertEqual(search.postgres_tsquery(terms), "'choc':* & 'piz':*")
+
+
+@mock.patch('foodapp.sync.SYNC_SETTLE', timedelta(0))
+class MenuSyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.restaurant = User.objects.create_user(username='chef', password='pass12345')
+        self.restaurant.profile.role = 'restaurant'
+        self.restaurant.profile.save()
+        self.tea = Food.objects.create(name='Tea', price=Decimal('1000'), restaurant=self.restaurant)
+        self.chips = Food.objects.create(name='Chips', price=Decimal('3000'), restaurant=self.restaurant)
+
+    def test_cold_sync_then_delta(self):
+        response = self.client.get('/api/foods/changes/')
+        self.assertEqual([food['name'] for food in response.data['changed']], ['Tea', 'Chips'])
+        cursor = response.data['cursor']
+
+        response = self.client.get('/api/foods/changes/', {'since': cursor})
+        self.assertEqual(response.data['changed'], [])
+
+        self.tea.price = Decimal('1200')
+        self.tea.save()
+        response = self.client.get('/api/foods/changes/', {'since': cursor})
+        self.assertEqual([food['name'] for food in response.data['changed']], ['Tea'])
+
+    def test_deleted_food_becomes_tombstone(self):
+        cursor = self.client.get('/api/foods/changes/').data['cursor']
+        self.client.force_authenticate(self.restaurant)
+        response = self.client.delete(f'/api/foods/{self.chips.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Food.objects.filter(id=self.chips.id).exists())
+
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/foods/changes/', {'since': cursor})
+        self.assertEqual(response.data['removed'], [self.chips.id])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/foods/changes/', {'since': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MenuFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Food.objects.create(name='Tea', category='Drink', price=Decimal('1000'), stock=3)
+        Food.objects.create(name='Juice', category='Drink', price=Decimal('2500'), stock=0)
+        Food.objects.create(name='Steak', category='Main', price=Decimal('25000'), stock=2)
+        Food.objects.create(name='Hidden', category='Main', price=Decimal('100'), available=False)
+
+    def test_facets_use_one_query_and_are_cached(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/foods/facets/')
+        categories = {row['category']: row for row in response.data['categories']}
+        self.assertEqual(categories['Drink']['count'], 2)
+        self.assertEqual(categories['Drink']['in_stock'], 1)
+        self.assertEqual(categories['Dessert']['count'], 0)
+        self.assertEqual([row['count'] for row in response.data['price_buckets']], [1, 1, 0, 0, 1])
+        self.assertEqual(response.data['total'], 3)
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/foods/facets/')
+
+
+class PopularFoodTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user('sales-customer', password='pw')
+        self.tea = Food.objects.create(name='Tea', price=Decimal('1000'))
+        self.soup = Food.objects.create(name='Soup', price=Decimal('3000'))
+
+    def deliver(self, *lines):
+        order = Order.objects.create(customer=self.customer)
+        for food, quantity in lines:
+            OrderItem.objects.create(order=order, food=food, quantity=quantity, price=food.price * quantity)
+        order.status = 'delivered'
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        return order
+
+    def test_delivered_orders_feed_the_rollup_once(self):
+        order = self.deliver((self.tea, 2), (self.soup, 1))
+        self.deliver((self.tea, 3))
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+
+        rollup = FoodSalesRollup.objects.get(food=self.tea)
+        self.assertEqual(rollup.quantity, 5)
+        self.assertEqual(rollup.revenue, Decimal('5000'))
+
+        response = self.client.get('/api/foods/popular/?window=7d')
+        self.assertEqual([row['name'] for row in response.data], ['Tea', 'Soup'])
+        self.assertEqual(response.data[0]['quantity_sold'], 5)
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/foods/popular/?window=7d')
+
+        self.deliver((self.soup, 9))
+        response = self.client.get('/api/foods/popular/?window=7d&limit=1')
+        self.assertEqual([row['name'] for row in response.data], ['Soup'])
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.deliver((self.tea, 2), (self.soup, 1))
+        self.deliver((self.tea, 1))
+        before = sorted(FoodSalesRollup.objects.values_list('food_id', 'day', 'quantity', 'revenue'))
+
+        call_command('backfill_sales_rollup', stdout=io.StringIO())
+        after = sorted(FoodSalesRollup.objects.values_list('food_id', 'day', 'quantity', 'revenue'))
+        self.assertEqual(before, after)
+
+    def test_invalid_window_is_rejected(self):
+        self.assertEqual(self.client.get('/api/foods/popular/?window=365d').status_code, 400)
+
+
+class BulkMenuTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.restaurant = User.objects.create_user(username='chef', password='pass12345')
+        self.restaurant.profile.role = 'restaurant'
+        self.restaurant.profile.save()
+        self.tea = Food.objects.create(name='Tea', price=Decimal('1000'), restaurant=self.restaurant)
+        self.other = Food.objects.create(name='Elsewhere', price=Decimal('1000'))
+        self.client.force_authenticate(self.restaurant)
+
+    def test_csv_import_creates_updates_and_reports_bad_rows(self):
+        body = (
+            'id,name,price,category,stock\n'
+            f'{self.tea.id},,1200,,\n'
+            ',Pilau,6000,Main,4\n'
+            ',Bad,notaprice,Main,\n'
+            f'{self.other.id},Stolen,1,,\n'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.generic('POST', '/api/foods/bulk/', body, content_type='text/csv')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [3, 4])
+
+        self.tea.refresh_from_db()
+        self.assertEqual(self.tea.price, Decimal('1200'))
+        self.assertEqual(self.tea.name, 'Tea')
+        self.assertTrue(Food.objects.filter(name='Pilau', restaurant=self.restaurant, stock=4).exists())
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.name, 'Elsewhere')
+
+    def test_ndjson_import_and_streaming_export(self):
+        body = '{"name": "Chai", "price": "700"}\n\nnot json\n'
+        response = self.client.generic('POST', '/api/foods/bulk/', body, content_type='application/x-ndjson')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+
+        response = self.client.get('/api/foods/bulk/?as=ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Tea', 'Chai'])
+        self.assertEqual(rows[1]['price'], '700.00')
+
+        response = self.client.get('/api/foods/bulk/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,name,description,price,stock,category,available')
+        self.assertEqual(len(lines), 3)
+
+    def test_chunks_before_a_malformed_line_invalidate_the_menu(self):
+        public = APIClient()
+        public.get('/api/foods/')
+        stream = io.BytesIO(b'name,price\nPilau,6000\nBroken,\xff\n')
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(UnicodeDecodeError):
+                bulk.MenuImport(self.restaurant).run(bulk.read_csv(stream), chunk_size=1)
+        response = public.get('/api/foods/')
+        self.assertIn('Pilau', [row['name'] for row in response.data])
+
+    def test_rejects_customers_and_unknown_formats(self):
+        response = self.client.generic('POST', '/api/foods/bulk/', 'x', content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+        self.client.force_authenticate(User.objects.create_user('diner', password='pw'))
+        self.assertEqual(self.client.get('/api/foods/bulk/').status_code, 403)
+
+
+class MenuEntryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.tea = Food.objects.create(name='Tea', price=Decimal('1000'), stock=2)
+        self.chips = Food.objects.create(name='Chips', price=Decimal('3000'), category='Side')
+
+    def test_public_list_reads_only_the_read_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/foods/?category=Side')
+        self.assertEqual([row['id'] for row in response.data], [self.chips.id])
+        self.assertEqual(response.data[0]['price'], '3000.00')
+        self.assertTrue(queries.captured_queries)
+        self.assertFalse([q for q in queries if 'foodapp_food"' in q['sql']])
+
+    def test_read_table_follows_food_writes(self):
+        self.tea.price = Decimal('1200')
+        self.tea.save()
+        self.assertEqual(MenuEntry.objects.get(pk=self.tea.pk).price, Decimal('1200'))
+
+        self.chips.soft_delete()
+        self.assertEqual(list(MenuEntry.objects.values_list('pk', flat=True)), [self.tea.pk])
+
+        self.tea.available = False
+        self.tea.save()
+        self.assertFalse(MenuEntry.objects.exists())
+
+    def test_refresh_upserts_existing_entries(self):
+        Food.objects.filter(pk=self.tea.pk).update(name='Chai')
+        refresh_menu_entries([self.tea.pk, self.chips.pk])
+        refresh_menu_entries([self.tea.pk])
+        self.assertEqual(MenuEntry.objects.get(pk=self.tea.pk).name, 'Chai')
+        self.assertEqual(MenuEntry.objects.count(), 2)
+
+    def test_api_write_and_refresh_commit_together(self):
+        restaurant = User.objects.create_user(username='chef', password='pass12345')
+        restaurant.profile.role = 'restaurant'
+        restaurant.profile.save()
+        Food.objects.filter(pk=self.tea.pk).update(restaurant=restaurant)
+        self.client.force_authenticate(restaurant)
+
+        with mock.patch('foodapp.signals.refresh_menu_entries', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.client.patch(f'/api/foods/{self.tea.pk}/', {'price': '1500'}, format='json')
+        self.tea.refresh_from_db()
+        self.assertEqual(self.tea.price, Decimal('1000'))
+
+    @override_settings(API_FAST_LISTS=True)
+    def test_fast_list_matches_serializer_output(self):
+        fast = self.client.get('/api/foods/').data
+        with override_settings(API_FAST_LISTS=False, API_FRAGMENT_CACHE=False):
+            cache.clear()
+            slow = self.client.get('/api/foods/').data
+        self.assertEqual(fast, slow)
+
+
+@override_settings(FOOD_IMAGE_VARIANTS_ASYNC=False)
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(
+            MEDIA_ROOT=self.media.name, FOOD_UPLOAD_STAGING_DIR=os.path.join(self.media.name, 'staging')
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.client = APIClient()
+        self.restaurant = User.objects.create_user(username='chef', password='pass12345')
+        self.restaurant.profile.role = 'restaurant'
+        self.restaurant.profile.save()
+        self.food = Food.objects.create(name='Pilau', price=Decimal('6000'), restaurant=self.restaurant)
+
+    def photo(self, size=(2000, 1500), name='pilau.png'):
+        buffer = io.BytesIO()
+        Image.new('RGBA', size, (200, 120, 40, 255)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_builds_variants_exposed_as_srcset(self):
+        self.client.force_authenticate(self.restaurant)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/foods/{self.food.id}/upload_image/', {'image': self.photo()}, format='multipart'
+            )
+        self.assertEqual(response.status_code, 202)
+
+        self.food.refresh_from_db()
+        self.assertEqual(set(self.food.image_variants), {'thumb', 'medium', 'large'})
+        self.assertEqual(self.food.image_variants['thumb']['width'], 160)
+
+        storage = Food._meta.get_field('image').storage
+        with storage.open(self.food.image_variants['large']['webp']) as stored:
+            self.assertEqual(Image.open(stored).size, (1024, 768))
+
+        self.client.force_authenticate(None)
+        srcset = self.client.get('/api/foods/').data[0]['srcset']
+        self.assertTrue(srcset['medium']['jpeg'].startswith('http://testserver/media/foods/variants/'))
+        self.assertEqual(srcset['medium']['width'], 480)
+
+    def test_backfill_builds_missing_variants_without_upscaling(self):
+        self.food.image.save('tiny.png', self.photo(size=(100, 80)))
+        out = io.StringIO()
+        call_command('backfill_image_variants', '--workers', '1', stdout=out)
+        self.assertIn('Built variants for 1 of 1', out.getvalue())
+
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.image_variants['large']['width'], 100)
+        self.assertEqual(MenuEntry.objects.get(pk=self.food.pk).image_variants, self.food.image_variants)
+
+
+@override_settings(FOOD_IMAGE_VARIANTS_ASYNC=False)
+class StreamingUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.staging = os.path.join(self.media.name, 'staging')
+        media = override_settings(MEDIA_ROOT=self.media.name, FOOD_UPLOAD_STAGING_DIR=self.staging)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.client = APIClient()
+        self.restaurant = User.objects.create_user(username='chef', password='pass12345')
+        self.restaurant.profile.role = 'restaurant'
+        self.restaurant.profile.save()
+        self.client.force_authenticate(self.restaurant)
+        self.food = Food.objects.create(name='Pilau', price=Decimal('6000'), restaurant=self.restaurant)
+
+    def camera_photo(self, size=(3000, 2000)):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'PhoneMaker'
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 120, 40)).save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('pilau.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def upload(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                f'/api/foods/{self.food.id}/upload_image/', {'image': upload}, format='multipart'
+            )
+
+    def staged(self):
+        return os.listdir(self.staging) if os.path.isdir(self.staging) else []
+
+    def test_photo_is_oriented_stripped_and_downscaled(self):
+        response = self.upload(self.camera_photo())
+        self.assertEqual(response.status_code, 202)
+
+        self.food.refresh_from_db()
+        self.assertTrue(self.food.image.name.endswith('.jpg'))
+        with self.food.image.open('rb') as stored:
+            image = Image.open(stored)
+            self.assertEqual(image.size, (1365, 2048))
+            self.assertEqual(dict(image.getexif()), {})
+        self.assertEqual(set(self.food.image_variants), {'thumb', 'medium', 'large'})
+        self.assertEqual(MenuEntry.objects.get(pk=self.food.pk).image, self.food.image.name)
+        self.assertEqual(self.staged(), [])
+
+    def test_rejects_non_images_by_content(self):
+        fake = SimpleUploadedFile('pilau.jpg', b'<?php echo "hi"; ?>' * 10, content_type='image/jpeg')
+        response = self.upload(fake)
+        self.assertEqual(response.status_code, 415)
+        self.food.refresh_from_db()
+        self.assertFalse(self.food.image)
+        self.assertEqual(self.staged(), [])
+
+    def test_rejects_oversized_upload_while_streaming(self):
+        with override_settings(FOOD_IMAGE_MAX_UPLOAD_BYTES=2000):
+            response = self.upload(self.camera_photo(size=(400, 300)))
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(self.staged(), [])
+
+    def test_rejects_oversized_body_before_reading_it(self):
+        with override_settings(FOOD_IMAGE_MAX_UPLOAD_BYTES=1000):
+            with mock.patch('foodapp.uploads.ImageUploadHandler.new_file') as new_file:
+                response = self.upload(SimpleUploadedFile('big.jpg', b'\xff\xd8\xff' + b'0' * 40000))
+        self.assertEqual(response.status_code, 413)
+        new_file.assert_not_called()
+
+    def test_command_processes_leftovers_newest_wins(self):
+        os.makedirs(self.staging)
+        for token, color in (('a1', (255, 0, 0)), ('b2', (0, 0, 255))):
+            Image.new('RGB', (64, 64), color).save(os.path.join(self.staging, f'{self.food.id}-{token}.png'))
+
+        out = io.StringIO()
+        call_command('process_staged_uploads', stdout=out)
+        self.assertIn('Stored 1 of 2', out.getvalue())
+
+        self.food.refresh_from_db()
+        with self.food.image.open('rb') as stored:
+            self.assertGreater(Image.open(stored).convert('RGB').getpixel((32, 32))[2], 200)
+        self.assertEqual(self.staged(), [])
+
+
+@override_settings(FOOD_IMAGE_VARIANTS_ASYNC=False)
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.staging = os.path.join(self.media.name, 'staging')
+        media = override_settings(MEDIA_ROOT=self.media.name, FOOD_UPLOAD_STAGING_DIR=self.staging)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.client = APIClient()
+        self.restaurant = User.objects.create_user(username='chef', password='pass12345')
+        self.restaurant.profile.role = 'restaurant'
+        self.restaurant.profile.save()
+        self.client.force_authenticate(self.restaurant)
+        self.food = Food.objects.create(name='Pilau', price=Decimal('6000'), restaurant=self.restaurant)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 400), (20, 160, 90)).save(buffer, 'PNG')
+        self.photo = buffer.getvalue()
+        self.url = f'/api/foods/{self.food.id}/uploads/'
+
+    def start(self):
+        response = self.client.post(self.url, {'size': len(self.photo)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return f"{self.url}{response.data['upload_id']}/"
+
+    def put(self, url, offset, data):
+        return self.client.put(url, data, content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_chunks_resume_after_a_dropped_connection(self):
+        url = self.start()
+        self.assertEqual(self.put(url, 0, self.photo[:1000]).data['offset'], 1000)
+
+        # A retried chunk at a stale offset is refused with the real offset
+        response = self.put(url, 0, self.photo[:1000])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 1000)
+
+        self.assertEqual(self.client.head(url)['Upload-Offset'], '1000')
+        response = self.put(url, 1000, self.photo[1000:])
+        self.assertEqual(response.data['offset'], len(self.photo))
+
+        # Nothing reaches the food until the upload is finalized
+        self.food.refresh_from_db()
+        self.assertFalse(self.food.image)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'{url}finalize/', {'sha256': hashlib.sha256(self.photo).hexdigest()}, format='json'
+            )
+        self.assertEqual(response.status_code, 202)
+        self.food.refresh_from_db()
+        with self.food.image.open('rb') as stored:
+            self.assertEqual(Image.open(stored).size, (600, 400))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_finalize_refuses_incomplete_or_corrupt_uploads(self):
+        url = self.start()
+        self.put(url, 0, self.photo[:500])
+        response = self.client.post(f'{url}finalize/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 500)
+
+        self.put(url, 500, self.photo[500:])
+        response = self.client.post(f'{url}finalize/', {'sha256': '0' * 64}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.food.refresh_from_db()
+        self.assertFalse(self.food.image)
+
+    def test_first_chunk_must_look_like_an_image(self):
+        url = self.start()
+        response = self.put(url, 0, b'MZ' + b'\0' * 100)
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_uploads_belong_to_their_owner(self):
+        url = self.start()
+        other = User.objects.create_user(username='rival', password='pass12345')
+        other.profile.role = 'restaurant'
+        other.profile.save()
+        self.client.force_authenticate(other)
+        self.assertEqual(self.put(url, 0, self.photo).status_code, 404)
+
+
+@override_settings(FOOD_IMAGE_VARIANTS_ASYNC=False)
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(
+            MEDIA_ROOT=self.media.name, FOOD_UPLOAD_STAGING_DIR=os.path.join(self.media.name, 'staging')
+        )
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.client = APIClient()
+        self.restaurant = User.objects.create_user(username='chef', password='pass12345')
+        self.restaurant.profile.role = 'restaurant'
+        self.restaurant.profile.save()
+        self.client.force_authenticate(self.restaurant)
+        self.food = Food.objects.create(name='Pilau', price=Decimal('6000'), restaurant=self.restaurant)
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 200), (240, 200, 40)).save(buffer, 'JPEG')
+        self.photo = buffer.getvalue()
+
+    def send(self, upload, data=None, content_type='image/jpeg'):
+        form = dict(upload['fields'], **{'Content-Type': content_type})
+        form['file'] = SimpleUploadedFile('pilau.jpg', data or self.photo, content_type=content_type)
+        # Straight to "storage": no credentials, like a bucket endpoint
+        return APIClient().post(upload['url'], form, format='multipart')
+
+    def test_presigned_upload_then_complete(self):
+        upload = self.client.post(f'/api/foods/{self.food.id}/direct_upload/').data
+        self.assertTrue(upload['key'].startswith(f'incoming/{self.food.id}/'))
+        self.assertEqual(self.send(upload).status_code, 204)
+
+        # Unchecked uploads are never served, however the path is spelled
+        for prefix in ('', './', 'foods/../'):
+            response = self.client.get(f"/media/{prefix}{upload['key']}")
+            self.assertEqual(response.status_code, 404, prefix)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/foods/{self.food.id}/direct_upload/complete/', {'key': upload['key']}, format='json'
+            )
+        self.assertEqual(response.status_code, 202)
+
+        self.food.refresh_from_db()
+        self.assertTrue(self.food.image.name.startswith('foods/'))
+        storage = Food._meta.get_field('image').storage
+        self.assertFalse(storage.exists(upload['key']))
+
+    def test_policy_is_enforced(self):
+        upload = self.client.post(f'/api/foods/{self.food.id}/direct_upload/').data
+        tampered = dict(upload, fields=dict(upload['fields'], key=f'foods/{"0" * 64}.jpg'))
+        self.assertEqual(self.send(tampered).status_code, 403)
+        self.assertEqual(self.send(upload, content_type='text/html').status_code, 403)
+        with override_settings(FOOD_IMAGE_MAX_UPLOAD_BYTES=100):
+            small = self.client.post(f'/api/foods/{self.food.id}/direct_upload/').data
+        self.assertEqual(self.send(small).status_code, 403)
+
+    def test_complete_rejects_foreign_or_missing_keys(self):
+        other = Food.objects.create(name='Chips', price=Decimal('3000'), restaurant=self.restaurant)
+        upload = self.client.post(f'/api/foods/{other.id}/direct_upload/').data
+        self.send(upload)
+        url = f'/api/foods/{self.food.id}/direct_upload/complete/'
+        self.assertEqual(self.client.post(url, {'key': upload['key']}, format='json').status_code, 400)
+        missing = f'incoming/{self.food.id}/{"a" * 32}'
+        self.assertEqual(self.client.post(url, {'key': missing}, format='json').status_code, 409)
+
+
+@skipUnless(Stubber, 'boto3 is not installed')
+class S3StorageTests(TestCase):
+    def setUp(self):
+        self.storage = ContentAddressedS3Storage(
+            bucket='menu', endpoint_url='http://minio:9000', region='us-east-1',
+            access_key='minio', secret_key='minio-secret',
+        )
+
+    def test_urls_are_path_style_or_public_base(self):
+        self.assertEqual(self.storage.url('foods/a.jpg'), 'http://minio:9000/menu/foods/a.jpg')
+        self.storage.public_url = 'https://cdn.example.com'
+        self.assertEqual(self.storage.url('foods/a.jpg'), 'https://cdn.example.com/foods/a.jpg')
+
+    def test_presigned_post_limits_size_and_type(self):
+        upload = self.storage.presigned_upload('incoming/1/abc', 5000, 600)
+        self.assertEqual(upload['url'], 'http://minio:9000/menu')
+        self.assertEqual(upload['fields']['key'], 'incoming/1/abc')
+        policy = json.loads(base64.b64decode(upload['fields']['policy']))
+        self.assertIn(['content-length-range', 1, 5000], policy['conditions'])
+        self.assertIn(['starts-with', '$Content-Type', 'image/'], policy['conditions'])
+
+    def test_listdir_and_exists(self):
+        with Stubber(self.storage.client) as stub:
+            stub.add_response('list_objects_v2', {
+                'CommonPrefixes': [{'Prefix': 'foods/variants/'}],
+                'Contents': [{'Key': 'foods/a.jpg'}],
+            }, {'Bucket': 'menu', 'Prefix': 'foods/', 'Delimiter': '/'})
+            stub.add_client_error('head_object', service_error_code='404', http_status_code=404)
+            self.assertEqual(self.storage.listdir('foods'), (['variants'], ['a.jpg']))
+            self.assertFalse(self.storage.exists('foods/b.jpg'))
+
+    def test_duplicate_save_refreshes_the_stored_object(self):
+        content = ContentFile(b'same bytes')
+        name = self.storage.content_name('foods/a.jpg', content)
+        with Stubber(self.storage.client) as stub:
+            stub.add_response('head_object', {'ContentLength': 10}, {'Bucket': 'menu', 'Key': name})
+            stub.add_response('copy_object', {}, {
+                'Bucket': 'menu', 'Key': name, 'CopySource': {'Bucket': 'menu', 'Key': name},
+                'MetadataDirective': 'REPLACE', 'ContentType': 'image/jpeg',
+                'CacheControl': 'public, max-age=31536000, immutable',
+            })
+            self.assertEqual(self.storage.save('foods/a.jpg', content), name)
+            stub.assert_no_pending_responses()
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.storage = Food._meta.get_field('image').storage
+
+    def test_identical_uploads_share_one_file(self):
+        first = Food.objects.create(name='Pizza', price=Decimal('9000'))
+        second = Food.objects.create(name='Pizza again', price=Decimal('9000'))
+        first.image.save('Pizza.JPG', ContentFile(b'same bytes'))
+        second.image.save('Pizza.jpg', ContentFile(b'same bytes'))
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^foods/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(self.storage.listdir('foods')[1], [os.path.basename(first.image.name)])
+
+    def test_gc_removes_only_unreferenced_files(self):
+        food = Food.objects.create(name='Pizza', price=Decimal('9000'))
+        food.image.save('Pizza.jpg', ContentFile(b'v1'))
+        old_name = food.image.name
+        food.image.save('Pizza.jpg', ContentFile(b'v2'))
+        legacy = FileSystemStorage(location=self.media.name).save('foods/Pizza_x8Kq2.jpg', ContentFile(b'v0'))
+
+        out = io.StringIO()
+        call_command('gc_food_images', '--grace-minutes', '0', stdout=out)
+        self.assertIn('Removed 2 unreferenced files', out.getvalue())
+        self.assertFalse(self.storage.exists(old_name))
+        self.assertFalse(self.storage.exists(legacy))
+        self.assertTrue(self.storage.exists(food.image.name))
+
+    def test_reupload_of_an_old_orphan_survives_gc(self):
+        name = self.storage.save('foods/Pizza.jpg', ContentFile(b'orphan'))
+        old = (datetime.now() - timedelta(days=1)).timestamp()
+        os.utime(self.storage.path(name), (old, old))
+
+        # Saved again just before its new Food row commits
+        self.assertEqual(self.storage.save('foods/Pizza.jpg', ContentFile(b'orphan')), name)
+        call_command('gc_food_images', stdout=io.StringIO())
+        self.assertTrue(self.storage.exists(name))
+
+    def test_hashed_media_is_served_immutable(self):
+        name = self.storage.save('foods/Tea.png', ContentFile(b'tea'))
+        response = self.client.get(f'/media/{name}')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media = override_settings(MEDIA_ROOT=self.media.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.name = Food._meta.get_field('image').storage.save('foods/menu.svg', ContentFile(b'0123456789'))
+
+    def test_conditional_get_returns_304(self):
+        response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        etag = response['ETag']
+        self.assertIn(os.path.splitext(os.path.basename(self.name))[0], etag)
+
+        response = self.client.get(f'/media/{self.name}', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_byte_ranges(self):
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+
+        # A stale If-Range gets the whole file
+        response = self.client.get(f'/media/{self.name}', HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_precompressed_sibling_and_offload(self):
+        with open(os.path.join(self.media.name, self.name + '.gz'), 'wb') as sibling:
+            sibling.write(gzip.compress(b'0123456789'))
+        response = self.client.get(f'/media/{self.name}', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'0123456789')
+
+        with mock.patch('foodapp.media.MEDIA_SERVE_MODE', 'x-accel'):
+            response = self.client.get(f'/media/{self.name}')
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_paths_outside_media_root_are_404(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/foods/').status_code, 404)
+
+
+class BulkUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.restaurant = User.objects.create_user(username='chef', password='pass12345')
+        self.restaurant.profile.role = 'restaurant'
+        self.restaurant.profile.save()
+        self.tea = Food.objects.create(name='Tea', price=Decimal('1000'), stock=5, restaurant=self.restaurant)
+        self.chips = Food.objects.create(name='Chips', price=Decimal('3000'), restaurant=self.restaurant)
+        self.other = Food.objects.create(name='Elsewhere', price=Decimal('1000'))
+        self.client.force_authenticate(self.restaurant)
+
+    def test_updates_many_dishes_in_one_statement(self):
+        before = self.client.get('/api/foods/')
+        payload = [
+            {'id': self.tea.id, 'available': False},
+            {'id': self.chips.id, 'price': '3500', 'stock': 9},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/foods/bulk_update/', payload, format='json')
+        self.assertEqual(response.data, {'updated': 2})
+        food_writes = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "foodapp_food"')]
+        self.assertEqual(len(food_writes), 1)
+
+        self.tea.refresh_from_db()
+        self.chips.refresh_from_db()
+        self.assertEqual((self.tea.available, self.tea.price, self.tea.stock), (False, Decimal('1000'), 5))
+        self.assertEqual((self.chips.price, self.chips.stock), (Decimal('3500'), 9))
+
+        after = self.client.get('/api/foods/', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        chips = next(row for row in after.data if row['id'] == self.chips.id)
+        self.assertEqual(chips['price'], '3500.00')
+
+    def test_other_restaurants_dishes_abort_the_whole_update(self):
+        payload = [{'id': self.tea.id, 'stock': 0}, {'id': self.other.id, 'stock': 0}]
+        response = self.client.post('/api/foods/bulk_update/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['ids'], [self.other.id])
+        self.tea.refresh_from_db()
+        self.assertEqual(self.tea.stock, 5)
+
+    def test_rejects_empty_updates(self):
+        response = self.client.post('/api/foods/bulk_update/', [{'id': self.tea.id}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Food.objects.create(name='Fried Chicken', price=Decimal('8000'))
+        Food.objects.create(name='Chips', price=Decimal('3000'))
+        Food.objects.create(name='Crème brûlée', price=Decimal('4000'))
+        Food.objects.create(name='Chapati', price=Decimal('500'), available=False)
+
+    def names(self, url):
+        return [row['name'] for row in self.client.get(url).data]
+
+    def test_prefix_matches_word_starts_without_queries(self):
+        self.assertEqual(self.names('/api/foods/suggest/?prefix=chi'), ['Chips', 'Fried Chicken'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('/api/foods/suggest/?prefix=CREME'), ['Crème brûlée'])
+            self.assertEqual(self.names('/api/foods/suggest/?prefix=fried%20c'), ['Fried Chicken'])
+            self.assertEqual(self.names('/api/foods/suggest/?prefix=xyz'), [])
+
+    def test_index_rebuilds_when_menu_changes(self):
+        self.assertEqual(self.names('/api/foods/suggest/?prefix=cha'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Food.objects.create(name='Chai', price=Decimal('700'))
+        self.assertEqual(self.names('/api/foods/suggest/?prefix=cha'), ['Chai'])
+
+    def test_prefix_is_required(self):
+        self.assertEqual(self.client.get('/api/foods/suggest/').status_code, 400)
+
+
+class RelatedFoodTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user('pair-customer', password='pw')
+        self.rice = Food.objects.create(name='Rice', price=Decimal('2000'))
+        self.beans = Food.objects.create(name='Beans', price=Decimal('1500'))
+        self.tea = Food.objects.create(name='Tea', price=Decimal('1000'))
+        self.hidden = Food.objects.create(name='Hidden', price=Decimal('1000'), available=False)
+
+    def place(self, foods, status='approved'):
+        order = Order.objects.create(customer=self.customer)
+        for food in foods:
+            OrderItem.objects.create(order=order, food=food, quantity=1, price=food.price)
+        order.status = status
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        return order
+
+    def test_related_reads_incremental_top_k(self):
+        self.place([self.rice, self.beans, self.tea])
+        self.place([self.rice, self.beans, self.hidden])
+        self.place([self.rice, self.tea], status='pending')
+
+        # The dish itself, then its related rows
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/foods/{self.rice.id}/related/')
+        self.assertEqual([row['name'] for row in response.data], ['Beans', 'Tea'])
+        self.assertEqual(response.data[0]['together_count'], 2)
+
+    def test_unknown_or_hidden_dish_is_not_found(self):
+        for pk in ('abc', self.hidden.id, 999999):
+            self.assertEqual(self.client.get(f'/api/foods/{pk}/related/').status_code, 404, pk)
+
+    def test_batch_rebuild_matches_incremental(self):
+        self.place([self.rice, self.beans, self.tea])
+        self.place([self.rice, self.beans])
+        self.place([self.beans, self.tea], status='delivered')
+        incremental = sorted(RelatedFood.objects.values_list('food', 'related', 'rank', 'together_count'))
+
+        call_command('build_recommendations', stdout=io.StringIO())
+        rebuilt = sorted(RelatedFood.objects.values_list('food', 'related', 'rank', 'together_count'))
+        self.assertEqual(incremental, rebuilt)
+
+    def test_numpy_and_python_counts_agree(self):
+        order_ids = [1, 1, 1, 2, 2, 3]
+        food_ids = [5, 7, 9, 5, 7, 9]
+        expected = recommendations._count_pairs_python(order_ids, food_ids)
+        self.assertEqual(expected[(5, 7)], 2)
+        if recommendations.np is not None:
+            self.assertEqual(recommendations._count_pairs_numpy(order_ids, food_ids), expected)
+
+
+@override_settings(API_FRAGMENT_CACHE=False)
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username='bob', email='bob@example.com', password='pass12345')
+        food = Food.objects.create(name='Tea', price=Decimal('1000'))
+        for _ in range(3):
+            order = Order.objects.create(customer=self.customer, total_price=Decimal('2000'))
+            OrderItem.objects.create(order=order, food=food, quantity=2, price=Decimal('2000'))
+            Notification.objects.create(user=self.customer, order=order, type='new_order', message='New')
+        self.client.force_authenticate(self.customer)
+
+    def test_fields_limits_output_and_skips_relations(self):
+        # No items prefetch and no customer join
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/?fields=id,status,total_price')
+        self.assertEqual(set(response.data[0]), {'id', 'status', 'total_price'})
+
+    def test_full_order_list_prefetches_items(self):
+        # Orders joined to customer, then items, then their foods
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.data[0]['items'][0]['food_name'], 'Tea')
+        self.assertEqual(response.data[0]['customer_username'], 'bob')
+
+    def test_expanded_restaurant_shows_no_account_details(self):
+        chef = User.objects.create_user(username='chef-login', password='pass12345')
+        chef.profile.role = 'restaurant'
+        chef.profile.first_name = 'Mama'
+        chef.profile.last_name = 'Ntilie'
+        chef.profile.save()
+        food = Food.objects.create(name='Pilau', price=Decimal('6000'), restaurant=chef)
+
+        # The food joined to its restaurant, then the restaurant's profile
+        with self.assertNumQueries(2):
+            response = APIClient().get(f'/api/foods/{food.id}/?fields=id,restaurant&expand=restaurant')
+        self.assertEqual(response.data['restaurant'], {'id': chef.id, 'name': 'Mama Ntilie'})
+
+    def test_expand_nests_related_object(self):
+        response = self.client.get('/api/orders/?fields=id,customer&expand=customer')
+        self.assertEqual(response.data[0]['customer'], {'id': self.customer.id, 'username': 'bob'})
+
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/notifications/?expand=order')
+        self.assertEqual(response.data[0]['order']['items'][0]['quantity'], 2)
+
+
+class OrderPlacementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username='erin', password='pass12345')
+        for name in ('chef', 'sous'):
+            staff = User.objects.create_user(username=name, password='pass12345')
+            staff.profile.role = 'restaurant'
+            staff.profile.save()
+        self.foods = [
+            Food.objects.create(name=f'Dish {index}', price=Decimal('7500.50') + index)
+            for index in range(5)
+        ]
+        self.client.force_authenticate(self.customer)
+
+    def place(self, foods, quantity=3):
+        return self.client.post('/api/orders/', {
+            'delivery_address': 'Kariakoo',
+            'items': [{'food': food.id, 'quantity': quantity} for food in foods],
+        }, format='json')
+
+    def test_totals_are_exact_decimals(self):
+        response = self.place(self.foods[:2])
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.total_price, Decimal('45006.00'))
+        self.assertEqual(
+            sorted(order.orderitem_set.values_list('price', flat=True)),
+            [Decimal('22501.50'), Decimal('22504.50')],
+        )
+        self.assertEqual(Notification.objects.filter(order=order).count(), 2)
+
+    def test_query_count_does_not_grow_with_items(self):
+        self.place(self.foods[:1])
+        # Food lookup, order insert, items insert, one stock UPDATE, the
+        # menu read model refresh (select, upsert), staff lookup,
+        # notifications insert, items (with foods) for the response, plus
+        # three savepoint pairs
+        with self.assertNumQueries(15):
+            response = self.place(self.foods)
+        self.assertEqual(len(response.data['items']), 5)
+        with self.assertNumQueries(15):
+            self.place(self.foods[:2])
+
+    def test_unavailable_food_places_nothing(self):
+        self.foods[0].available = False
+        self.foods[0].save()
+        response = self.place(self.foods)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def test_failed_item_insert_rolls_back_the_order(self):
+        with mock.patch.object(OrderItem.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.place(self.foods[:2])
+        self.assertFalse(Order.objects.exists())
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username='fay', password='pass12345')
+        self.restaurant = User.objects.create_user(username='chef', password='pass12345')
+        self.restaurant.profile.role = 'restaurant'
+        self.restaurant.profile.save()
+        self.food = Food.objects.create(name='Mandazi', price=Decimal('500'), stock=3, restaurant=self.restaurant)
+        self.client.force_authenticate(self.customer)
+
+    def place(self, quantity, food=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/', {
+                'delivery_address': 'Mbezi',
+                'items': [{'food': (food or self.food).id, 'quantity': quantity}],
+            }, format='json')
+
+    def test_orders_take_stock_and_sell_out(self):
+        self.assertEqual(self.place(2).status_code, 201)
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.stock, 1)
+        self.assertTrue(self.food.available)
+
+        self.assertEqual(self.place(1).status_code, 201)
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.stock, 0)
+        self.assertFalse(self.food.available)
+        self.assertFalse(MenuEntry.objects.filter(pk=self.food.pk).exists())
+
+    def test_never_oversells_when_stock_changed_after_validation(self):
+        serializer = OrderCreateSerializer(
+            data={'delivery_address': 'Mbezi', 'items': [{'food': self.food.id, 'quantity': 3}]},
+            context={'request': mock.Mock(user=self.customer)},
+        )
+        self.assertTrue(serializer.is_valid())
+        # Another order takes two portions between validation and save
+        Food.objects.filter(pk=self.food.pk).update(stock=1)
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.stock, 1)
+        self.assertFalse(Order.objects.exists())
+
+    def test_short_order_is_refused_up_front(self):
+        response = self.place(4)
+        self.assertEqual(response.status_code, 400)
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.stock, 3)
+
+    def test_reject_gives_stock_back_once(self):
+        order_id = self.place(3).data['id']
+        self.client.force_authenticate(self.restaurant)
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/api/orders/{order_id}/reject/', {'reason': 'Closed'})
+            self.assertEqual(response.status_code, 200)
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.stock, 3)
+        # Selling out took it off the menu, so the restock puts it back
+        self.assertTrue(self.food.available)
+        self.assertFalse(self.food.sold_out)
+        self.assertTrue(MenuEntry.objects.filter(pk=self.food.pk).exists())
+        self.assertFalse(Order.objects.get(pk=order_id).stock_reserved)
+
+    def test_restock_keeps_dishes_staff_took_off(self):
+        # Sold out, then staff also take it off the menu themselves
+        order_id = self.place(3).data['id']
+        self.client.force_authenticate(self.restaurant)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/foods/{self.food.id}/', {'available': False}, format='json')
+            self.client.post(f'/api/orders/{order_id}/reject/', {'reason': 'Closed'})
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.stock, 3)
+        self.assertFalse(self.food.available)
+        self.assertFalse(self.food.sold_out)
+
+    def test_untracked_stock_is_never_short(self):
+        untracked = Food.objects.create(name='Chai', price=Decimal('300'), restaurant=self.restaurant)
+        self.assertIsNone(untracked.stock)
+        response = self.place(50, food=untracked)
+        self.assertEqual(response.status_code, 201)
+        untracked.refresh_from_db()
+        self.assertIsNone(untracked.stock)
+        self.assertTrue(untracked.available)
+        response = self.client.get('/api/foods/', {'in_stock': 'true'})
+        self.assertIn(untracked.id, [row['id'] for row in response.data])
+
+    def test_release_is_claimed_atomically(self):
+        order_id = self.place(2).data['id']
+        stale = Order.objects.get(pk=order_id)
+        self.assertTrue(stock.release_stock(Order.objects.get(pk=order_id)))
+        self.assertFalse(stock.release_stock(stale))
+        self.food.refresh_from_db()
+        self.assertEqual(self.food.stock, 3)
+
+
+class FastListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username='carol', email='carol@example.com', password='pass12345')
+        restaurant = User.objects.create_user(username='chef', password='pass12345')
+        foods = [
+            Food.objects.create(name='Tea', price=Decimal('1000'), image='foods/tea.jpg'),
+            Food.objects.create(
+                name='Pilau', description='Spiced rice', price=Decimal('7500.5'),
+                stock=4, category='Main', restaurant=restaurant,
+            ),
+        ]
+        for index in range(3):
+            order = Order.objects.create(
+                customer=self.customer, total_price=Decimal('8500.50'), delivery_address=f'Street {index}'
+            )
+            for food in foods:
+                OrderItem.objects.create(order=order, food=food, quantity=index + 1, price=food.price)
+        Order.objects.create(customer=self.customer, total_price=Decimal('0'))
+
+    def render_both(self, url):
+        cache.clear()
+        with override_settings(API_FAST_LISTS=False):
+            expected = self.client.get(url)
+        cache.clear()
+        with override_settings(API_FAST_LISTS=True):
+            actual = self.client.get(url)
+        return expected, actual
+
+    def test_food_list_matches_serializer_output(self):
+        expected, actual = self.render_both('/api/foods/')
+        self.assertEqual(actual.status_code, 200)
+        self.assertEqual(actual.content, expected.content)
+
+    def test_order_list_matches_serializer_output(self):
+        self.client.force_authenticate(self.customer)
+        for url in ('/api/orders/', '/api/orders/?fields=id,items,created_at'):
+            expected, actual = self.render_both(url)
+            self.assertEqual(actual.content, expected.content)
+
+    @override_settings(API_FAST_LISTS=True)
+    def test_order_list_uses_constant_queries(self):
+        self.client.force_authenticate(self.customer)
+        # Orders, then all of their items
+        with self.assertNumQueries(2):
+            self.client.get('/api/orders/')
+
+
+class FastJSONTests(TestCase):
+    payload = {
+        'price': Decimal('12.50'),
+        'at': datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        'text': 'Chai\u2028ya tangawizi',
+        'items': [{'id': 1}, {'id': 2, 'name': None}],
+    }
+
+    def test_renderer_matches_stdlib_renderer(self):
+        for backend in ('auto', 'stdlib'):
+            with override_settings(API_JSON_BACKEND=backend):
+                self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_parser_round_trip(self):
+        body = FastJSONRenderer().render(self.payload)
+        parsed = FastJSONParser().parse(io.BytesIO(body), parser_context={'encoding': 'utf-8'})
+        self.assertEqual(parsed['price'], 12.5)
+        self.assertEqual(parsed['text'], self.payload['text'])
+
+
+class MessagePackTests(TestCase):
+    def test_orders_negotiate_msgpack_and_round_trip(self):
+        customer = User.objects.create_user(username='dan', password='pass12345')
+        food = Food.objects.create(name='Samosa', price=Decimal('500.00'))
+        for _ in range(2):
+            order = Order.objects.create(customer=customer, total_price=Decimal('1500.00'))
+            OrderItem.objects.create(order=order, food=food, quantity=3, price=Decimal('1500.00'))
+        client = APIClient()
+        client.force_authenticate(customer)
+
+        expected = client.get('/api/orders/').json()
+        response = client.get('/api/orders/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertLess(len(response.content), len(JSONRenderer().render(expected)))
+        parsed = MessagePackParser().parse(io.BytesIO(response.content))
+        self.assertEqual(parsed, expected)
+
+    def test_decimals_round_trip_exactly(self):
+        payload = {'quantity': Decimal('0.10'), 'rows': [{'a': Decimal('1E+2')}, {'a': None}]}
+        body = MessagePackRenderer().render(payload)
+        self.assertEqual(MessagePackParser().parse(io.BytesIO(body)), payload)
+        self.assertEqual(str(MessagePackParser().parse(io.BytesIO(body))['quantity']), '0.10')
+
+    def test_malformed_decimals_are_parse_errors(self):
+        # ext 8 headers: length, type 1 (decimal), then the "digits"
+        for body in (b'\xc7\x03\x01abc', b'\xc7\x01\x01\xff', b'\xc7\x03\x01NaN'):
+            with self.assertRaises(ParseError):
+                MessagePackParser().parse(io.BytesIO(body))
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(username='erin', password='pass12345')
+        self.food = Food.objects.create(name='Mandazi', price=Decimal('300.00'))
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                order = Order.objects.create(customer=self.customer, total_price=Decimal('600.00'))
+                OrderItem.objects.create(order=order, food=self.food, quantity=2, price=Decimal('600.00'))
+        self.order = order
+        self.client.force_authenticate(self.customer)
+
+    def test_warm_list_only_reads_primary_keys(self):
+        expected = self.client.get('/api/orders/').json()
+        # Order pks, then the dishes each order contains
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/orders/')
+        self.assertEqual(response.json(), expected)
+
+    def test_changed_row_is_reserialized_alone(self):
+        self.client.get('/api/orders/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.status = 'approved'
+            self.order.save()
+        # pks, their dishes, the one stale order (+ customer), its items,
+        # their food
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/orders/')
+        statuses = {row['id']: row['status'] for row in response.data}
+        self.assertEqual(statuses[self.order.id], 'approved')
+
+    def test_food_change_refreshes_order_items(self):
+        self.client.get('/api/orders/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food.name = 'Mandazi ya nazi'
+            self.food.save()
+        response = self.client.get('/api/orders/')
+        self.assertEqual(response.data[0]['items'][0]['food_name'], 'Mandazi ya nazi')
+
+    def test_customer_renames_refresh_and_logins_do_not(self):
+        self.client.get('/api/orders/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.save(update_fields=['last_login'])
+        with self.assertNumQueries(2):
+            self.client.get('/api/orders/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.username = 'erin.m'
+            self.customer.save()
+        response = self.client.get('/api/orders/')
+        self.assertEqual({row['customer_username'] for row in response.data}, {'erin.m'})
+
+    def test_other_dishes_leave_order_fragments_alone(self):
+        self.client.get('/api/orders/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Food.objects.create(name='Chapati', price=Decimal('200.00'))
+        with self.assertNumQueries(2):
+            self.client.get('/api/orders/')
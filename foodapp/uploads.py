@@ -0,0 +1,649 @@
+"""
+Streaming food photo uploads.
+
+POST /api/foods/<id>/upload_image/ no longer hands Django's default upload
+handlers the photo. The view refuses a request whose Content-Length is
+over the limit before reading the body; ImageUploadHandler then:
+
+- checks the first bytes against the image formats we accept,
+- streams the rest to a staging file, stopping as soon as the size limit
+  is crossed,
+- fsyncs the file and renames it to "<food id>-<token>.<ext>", at which
+  point the view answers 202.
+
+Decoding, EXIF stripping and downscaling (foodapp.imageproc) then run in a
+small process pool, so a huge photo never holds a web worker or the GIL.
+The result is stored through Food.image's content-addressed storage and the
+resized variants are built as for any other image (foodapp.images).
+
+Staged files are the queue: if a worker dies before a file is processed,
+`manage.py process_staged_uploads` picks it up again. A newer upload for the
+same food supersedes older staged ones.
+
+Phones on weak links can use ResumableUpload instead: the photo is sent as
+a series of PUTs at explicit offsets, each appended and fsynced to a
+per-upload directory, so a dropped connection only costs the chunk in
+flight. Finalizing moves the completed file into the staging directory,
+after which it is handled exactly like a single-request upload.
+
+Direct uploads skip the web workers altogether: the client gets a presigned
+POST for "incoming/<food id>/<id>" in Food.image's storage (an S3 bucket in
+production), sends the photo there, then reports the key. A pool worker
+copies the object into the staging directory and carries on as above.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .imageproc import ImageProcessingError, prepare_image
+from .images import _image_updated, _walk, generate_variants, get_pool
+from .models import Food
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+UPLOAD_FIELD = 'image'
+
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 16 * 1024
+
+# Leading bytes -> extension of the staged file
+MAGIC_NUMBERS = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SNIFF_BYTES = 12
+
+STAGED_NAME = re.compile(r'^(\d+)-([0-9a-f]+)\.([a-z]+)$')
+
+logger = logging.getLogger(__name__)
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def max_upload_bytes():
+    return getattr(settings, 'FOOD_IMAGE_MAX_UPLOAD_BYTES', 15 * 1024 * 1024)
+
+
+def body_too_large(request, max_bytes=None):
+    """Whether the declared request body can't hold an acceptable image"""
+    max_bytes = max_bytes if max_bytes is not None else max_upload_bytes()
+    try:
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        return False
+    return content_length > max_bytes + MULTIPART_OVERHEAD
+
+
+def staging_dir():
+    return str(getattr(settings, 'FOOD_UPLOAD_STAGING_DIR', os.path.join(settings.BASE_DIR, 'media_staging')))
+
+
+def get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            # spawn: forking a threaded server process can copy held locks
+            _process_pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'FOOD_UPLOAD_PROCESSES', 2),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+    return _process_pool
+
+
+def sniff(head):
+    """Extension for the image format head starts with, or None"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for magic, extension in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return extension
+    return None
+
+
+# ======================
+# RECEIVING
+# ======================
+class UploadRejected(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class UploadConflict(UploadRejected):
+    """The client's offset doesn't match what the server holds"""
+
+    def __init__(self, message, offset):
+        super().__init__(message, 409)
+        self.offset = offset
+
+
+class StagedImage(UploadedFile):
+    """A photo fully written to the staging directory"""
+
+    def __init__(self, path, name, size, content_type, sha256):
+        super().__init__(open(path, 'rb'), name, content_type, size)
+        self.staged_path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.staged_path
+
+
+class ImageUploadHandler(FileUploadHandler):
+    """
+    Stream the "image" part of a multipart body to the staging directory.
+    Other file parts are skipped. After parsing, `error` holds an
+    UploadRejected if the upload was refused.
+    """
+
+    def __init__(self, food_id, max_bytes=None, request=None):
+        super().__init__(request)
+        self.food_id = food_id
+        self.max_bytes = max_bytes if max_bytes is not None else max_upload_bytes()
+        self.error = None
+        # Not "file": MultiPartParser closes handler.file on its own
+        self.stream = None
+        self.part_path = None
+        self.received = False
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None,
+                 content_type_extra=None):
+        if field_name != UPLOAD_FIELD or self.received or self.error:
+            raise SkipFile()
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if content_length and content_length > self.max_bytes:
+            self.reject('Image is too large', 413)
+
+        directory = staging_dir()
+        os.makedirs(directory, exist_ok=True)
+        # Dot-prefixed until complete, so nothing processes a partial file
+        fd, self.part_path = tempfile.mkstemp(dir=directory, prefix=f'.{self.food_id}-', suffix='.part')
+        self.stream = os.fdopen(fd, 'wb')
+        self.head = b''
+        self.extension = None
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.stream is None:
+            return raw_data
+        if self.extension is None and len(self.head) < SNIFF_BYTES:
+            self.head += raw_data[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= SNIFF_BYTES:
+                self.extension = sniff(self.head)
+                if self.extension is None:
+                    self.reject('Unsupported image type; upload a JPEG, PNG, WebP or GIF', 415)
+        if start + len(raw_data) > self.max_bytes:
+            self.reject('Image is too large', 413)
+        self.stream.write(raw_data)
+        self.digest.update(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.stream is None:
+            return None
+        self.extension = self.extension or sniff(self.head)
+        if self.extension is None:
+            self.error = UploadRejected('Unsupported image type; upload a JPEG, PNG, WebP or GIF', 415)
+            self.discard()
+            return None
+
+        # Durable before we answer: the staged file is the work queue
+        self.stream.flush()
+        os.fsync(self.stream.fileno())
+        self.stream.close()
+        self.stream = None
+        path = staged_path(self.food_id, self.extension)
+        os.replace(self.part_path, path)
+        self.part_path = None
+        self.received = True
+        return StagedImage(path, self.file_name, file_size, self.content_type, self.digest.hexdigest())
+
+    def upload_interrupted(self):
+        self.discard()
+
+    def reject(self, message, status):
+        self.error = UploadRejected(message, status)
+        self.discard()
+        # Don't read the rest of the body just to throw it away
+        raise StopUpload(connection_reset=True)
+
+    def discard(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if self.part_path and os.path.exists(self.part_path):
+            os.unlink(self.part_path)
+        self.part_path = None
+
+
+def staged_path(food_id, extension):
+    """Where the next complete upload for food_id goes; newer names sort later"""
+    return os.path.join(staging_dir(), f'{food_id}-{time.time_ns():x}.{extension}')
+
+
+# ======================
+# RESUMABLE UPLOADS
+# ======================
+UPLOAD_ID = re.compile(r'^[0-9a-f]{32}$')
+
+READ_SIZE = 64 * 1024
+
+
+def max_chunk_bytes():
+    return getattr(settings, 'FOOD_UPLOAD_CHUNK_BYTES', 4 * 1024 * 1024)
+
+
+def resumable_dir():
+    return os.path.join(staging_dir(), 'resumable')
+
+
+class _Locked:
+    """Exclusive, non-blocking lock on an open file, so two requests can't
+    write the same upload at once"""
+
+    def __init__(self, target):
+        self.target = target
+
+    def __enter__(self):
+        if fcntl is not None:
+            try:
+                fcntl.flock(self.target.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadConflict('Another request is writing this upload', None)
+        return self.target
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self.target.fileno(), fcntl.LOCK_UN)
+
+
+class ResumableUpload:
+    """
+    An image sent over several requests. State lives on local disk in
+    <staging>/resumable/<id>/: meta.json (food, owner, declared size) and
+    data, whose length is the offset the client resumes from.
+    """
+
+    def __init__(self, upload_id, meta):
+        self.id = upload_id
+        self.food_id = meta['food_id']
+        self.user_id = meta['user_id']
+        self.size = meta['size']
+        self.filename = meta.get('filename', '')
+
+    @property
+    def directory(self):
+        return os.path.join(resumable_dir(), self.id)
+
+    @property
+    def data_path(self):
+        return os.path.join(self.directory, 'data')
+
+    @classmethod
+    def start(cls, food_id, user_id, size, filename=''):
+        if size > max_upload_bytes():
+            raise UploadRejected('Image is too large', 413)
+        meta = {'food_id': food_id, 'user_id': user_id, 'size': size, 'filename': filename[:255]}
+        upload = cls(uuid.uuid4().hex, meta)
+        os.makedirs(upload.directory)
+        open(upload.data_path, 'wb').close()
+        meta_path = os.path.join(upload.directory, 'meta.json')
+        with open(meta_path + '.tmp', 'w') as target:
+            json.dump(meta, target)
+        os.replace(meta_path + '.tmp', meta_path)
+        return upload
+
+    @classmethod
+    def load(cls, upload_id):
+        """The upload with this id, or None if it is unknown or finished"""
+        if not UPLOAD_ID.match(upload_id or ''):
+            return None
+        try:
+            with open(os.path.join(resumable_dir(), upload_id, 'meta.json')) as source:
+                return cls(upload_id, json.load(source))
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    @property
+    def offset(self):
+        try:
+            return os.path.getsize(self.data_path)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, stream, offset, length):
+        """
+        Write the next length bytes of the image, read from stream, at
+        offset. Whatever arrives before the connection drops is kept.
+        Returns the new offset.
+        """
+        if length > max_chunk_bytes():
+            raise UploadRejected('Chunk is too large', 413)
+        if offset + length > self.size:
+            raise UploadRejected('Chunk goes past the declared size', 413)
+
+        with open(self.data_path, 'r+b') as target, _Locked(target):
+            current = os.fstat(target.fileno()).st_size
+            if offset != current:
+                raise UploadConflict('Offset does not match the uploaded length', current)
+            target.seek(offset)
+            remaining = length
+            try:
+                while remaining:
+                    chunk = stream.read(min(READ_SIZE, remaining))
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    remaining -= len(chunk)
+            except OSError:
+                # Client went away mid-chunk; it resumes from what we have
+                pass
+            target.flush()
+            os.fsync(target.fileno())
+            new_offset = target.tell()
+
+            if offset < SNIFF_BYTES <= new_offset:
+                target.seek(0)
+                if sniff(target.read(SNIFF_BYTES)) is None:
+                    self.abort()
+                    raise UploadRejected('Unsupported image type; upload a JPEG, PNG, WebP or GIF', 415)
+        return new_offset
+
+    def finalize(self, sha256=None):
+        """
+        Move the complete image into the staging directory and forget the
+        upload. Returns the staged path.
+        """
+        with open(self.data_path, 'r+b') as target, _Locked(target):
+            current = os.fstat(target.fileno()).st_size
+            if current != self.size:
+                raise UploadConflict('Upload is incomplete', current)
+            extension = sniff(target.read(SNIFF_BYTES))
+            if extension is None:
+                self.abort()
+                raise UploadRejected('Unsupported image type; upload a JPEG, PNG, WebP or GIF', 415)
+            if sha256:
+                target.seek(0)
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: target.read(READ_SIZE), b''):
+                    digest.update(chunk)
+                if digest.hexdigest() != sha256.lower():
+                    self.abort()
+                    raise UploadRejected('Checksum does not match the uploaded bytes', 400)
+
+            path = staged_path(self.food_id, extension)
+            os.replace(self.data_path, path)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        return path
+
+    def abort(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def expire_resumable(max_age):
+    """Drop resumable uploads with no chunk for max_age seconds"""
+    root = resumable_dir()
+    if not os.path.isdir(root):
+        return 0
+    cutoff = time.time() - max_age
+    expired = 0
+    for upload_id in os.listdir(root):
+        directory = os.path.join(root, upload_id)
+        try:
+            last_write = os.path.getmtime(os.path.join(directory, 'data'))
+        except FileNotFoundError:
+            last_write = os.path.getmtime(directory)
+        if last_write < cutoff:
+            shutil.rmtree(directory, ignore_errors=True)
+            expired += 1
+    return expired
+
+
+# ======================
+# DIRECT UPLOADS
+# ======================
+INCOMING_PREFIX = 'incoming'
+
+
+def direct_upload_expires():
+    return getattr(settings, 'DIRECT_UPLOAD_EXPIRES', 15 * 60)
+
+
+def start_direct_upload(food_id):
+    """A presigned upload (url, form fields, key) for a new photo of food_id"""
+    storage = Food._meta.get_field('image').storage
+    key = f'{INCOMING_PREFIX}/{food_id}/{uuid.uuid4().hex}'
+    upload = storage.presigned_upload(key, max_upload_bytes(), direct_upload_expires())
+    upload['key'] = key
+    return upload
+
+
+def check_direct_upload_key(food_id, key):
+    """
+    Raise UploadRejected unless key is a finished direct upload for food_id
+    of acceptable size.
+    """
+    if not re.match(rf'^{INCOMING_PREFIX}/{food_id}/[0-9a-f]{{32}}$', key or ''):
+        raise UploadRejected('Unknown upload key', 400)
+    storage = Food._meta.get_field('image').storage
+    try:
+        size = storage.size(key)
+    except (FileNotFoundError, OSError):
+        raise UploadRejected('Nothing was uploaded under this key', 409)
+    if size > max_upload_bytes():
+        storage.delete(key)
+        raise UploadRejected('Image is too large', 413)
+
+
+def ingest_direct_upload(food_id, key, in_process=False):
+    """
+    Copy an incoming object into the staging directory, delete it from
+    storage and process it like any other upload.
+    """
+    storage = Food._meta.get_field('image').storage
+    with storage.open(key, 'rb') as source:
+        head = source.read(SNIFF_BYTES)
+        extension = sniff(head)
+        if extension is None:
+            logger.warning('Rejected direct upload %s: not an image', key)
+            path = None
+        else:
+            directory = staging_dir()
+            os.makedirs(directory, exist_ok=True)
+            fd, part_path = tempfile.mkstemp(dir=directory, prefix=f'.{food_id}-', suffix='.part')
+            with os.fdopen(fd, 'wb') as target:
+                target.write(head)
+                for chunk in iter(lambda: source.read(READ_SIZE), b''):
+                    target.write(chunk)
+                target.flush()
+                os.fsync(target.fileno())
+            path = staged_path(food_id, extension)
+            os.replace(part_path, path)
+    storage.delete(key)
+    if path is None:
+        return None
+    return process_staged(path, in_process=in_process)
+
+
+def expire_direct_uploads(max_age):
+    """Delete incoming objects nobody reported within max_age seconds"""
+    storage = Food._meta.get_field('image').storage
+    try:
+        names = list(_walk(storage, INCOMING_PREFIX))
+    except FileNotFoundError:
+        return 0
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    expired = 0
+    for name in names:
+        if storage.get_modified_time(name) < cutoff:
+            storage.delete(name)
+            expired += 1
+    return expired
+
+
+# ======================
+# PROCESSING
+# ======================
+def parse_staged_name(path):
+    """(food id, token) of a staged file, or None for anything else"""
+    match = STAGED_NAME.match(os.path.basename(path))
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2), 16)
+
+
+def staged_uploads():
+    """Paths of complete staged files, oldest first"""
+    directory = staging_dir()
+    if not os.path.isdir(directory):
+        return []
+    staged = []
+    for filename in os.listdir(directory):
+        parsed = parse_staged_name(filename)
+        if parsed:
+            staged.append((parsed[1], os.path.join(directory, filename)))
+    return [path for _, path in sorted(staged)]
+
+
+def _staged_for(food_id):
+    for path in staged_uploads():
+        other_food, other_token = parse_staged_name(path)
+        if other_food == food_id:
+            yield other_token, path
+
+
+def _discard(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def process_staged(path, in_process=False):
+    """
+    Turn one staged upload into the food's image. Returns the stored name,
+    or None if the upload was superseded, its food is gone, or it isn't a
+    decodable image (the staged file is removed in all three cases).
+    """
+    food_id, token = parse_staged_name(path)
+    if any(other > token for other, _ in _staged_for(food_id)):
+        # A newer upload for this food is queued behind this one
+        _discard(path)
+        return None
+
+    max_edge = getattr(settings, 'FOOD_IMAGE_MAX_EDGE', 2048)
+    max_pixels = getattr(settings, 'FOOD_IMAGE_MAX_PIXELS', 40_000_000)
+    try:
+        if in_process:
+            data, extension = prepare_image(path, max_edge, max_pixels)
+        else:
+            data, extension = get_process_pool().submit(prepare_image, path, max_edge, max_pixels).result()
+    except ImageProcessingError as exc:
+        logger.warning('Rejected staged upload %s: %s', path, exc)
+        _discard(path)
+        return None
+    if not os.path.exists(path):
+        # A newer upload for this food already took its place
+        return None
+
+    storage = Food._meta.get_field('image').storage
+    name = storage.save(f'foods/upload.{extension}', ContentFile(data))
+    with transaction.atomic():
+        updated = Food.all_objects.filter(pk=food_id).update(
+            image=name, image_variants={}, updated_at=timezone.now()
+        )
+        if updated:
+            _image_updated(food_id)
+    for other, other_path in _staged_for(food_id):
+        if other <= token:
+            _discard(other_path)
+    if not updated:
+        return None
+
+    generate_variants(food_id, name)
+    return name
+
+
+def remove_stale_parts(max_age):
+    """Delete partial uploads older than max_age seconds (their request died)"""
+    directory = staging_dir()
+    if not os.path.isdir(directory):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for filename in os.listdir(directory):
+        path = os.path.join(directory, filename)
+        if filename.startswith('.') and filename.endswith('.part') and os.path.getmtime(path) < cutoff:
+            os.unlink(path)
+            removed += 1
+    return removed
+
+
+def _run_in_worker(path):
+    try:
+        process_staged(path)
+    except Exception:
+        # The staged file stays put for process_staged_uploads to retry
+        logger.exception('Could not process staged upload %s', path)
+    finally:
+        close_old_connections()
+
+
+def _ingest_in_worker(food_id, key):
+    try:
+        ingest_direct_upload(food_id, key)
+    except Exception:
+        # The object stays in incoming/ until process_staged_uploads expires it
+        logger.exception('Could not ingest direct upload %s', key)
+    finally:
+        close_old_connections()
+
+
+def schedule_ingest(food_id, key):
+    """Ingest a direct upload after commit (inline with FOOD_IMAGE_VARIANTS_ASYNC off)"""
+    def submit():
+        if getattr(settings, 'FOOD_IMAGE_VARIANTS_ASYNC', True):
+            get_pool().submit(_ingest_in_worker, food_id, key)
+        else:
+            ingest_direct_upload(food_id, key, in_process=True)
+
+    transaction.on_commit(submit)
+
+
+def schedule_upload(path):
+    """
+    Process a staged file once the current transaction commits. With
+    settings.FOOD_IMAGE_VARIANTS_ASYNC off it runs inline, in this process.
+    """
+    def submit():
+        if getattr(settings, 'FOOD_IMAGE_VARIANTS_ASYNC', True):
+            get_pool().submit(_run_in_worker, path)
+        else:
+            process_staged(path, in_process=True)
+
+    transaction.on_commit(submit)
@@ -1,3 +1,5 @@
+import csv
+
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.generics import CreateAPIView, ListAPIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
@@ -8,11 +10,17 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework import status
 
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 
-from .models import Food, Order, OrderItem, Profile, Inventory, Notification
+from .models import Food, MenuEntry, Order, OrderItem, Profile, Inventory, RelatedFood, Notification
 from .serializers import (
     RegisterSerializer,
     FoodSerializer,
+    MenuEntrySerializer,
+    FoodBulkUpdateSerializer,
     OrderSerializer,
     OrderCreateSerializer,
     InventorySerializer,
@@ -22,6 +30,30 @@ from .serializers import (
     ProfileUpdateSerializer,
     
 )
+from .cache import (
+    menu_cache_key,
+    get_cached_menu,
+    set_cached_menu,
+    get_menu_version,
+    get_profile_version,
+    get_related_version,
+    get_sales_version,
+    make_etag,
+)
+from .mixins import ConditionalGetMixin, SparseQuerysetMixin, FastListMixin, FragmentCacheMixin
+from .fragments import related_versions, render_with_fragments
+from .filters import FoodFilter, parse_int
+from .pagination import FoodCursorPagination, FoodSearchPagination
+from .search import search_foods
+from .sync import changes_since
+from .facets import menu_facets
+from .sales import popular_foods
+from .bulk import BULK_UPDATE_LIMIT, BulkFormatError, export_csv, export_ndjson, import_menu, update_foods
+from .suggest import SUGGEST_LIMIT, suggest
+from .uploads import (
+    ImageUploadHandler, ResumableUpload, UploadConflict, UploadRejected, body_too_large,
+    check_direct_upload_key, max_chunk_bytes, schedule_ingest, schedule_upload, start_direct_upload,
+)
 
 # ============================
 # USER REGISTRATION
@@ -94,44 +126,349 @@ class LoginView(APIView):
 # ============================
 # FOOD VIEWSET
 # ============================
-class FoodViewSet(ModelViewSet):
+class FoodViewSet(ConditionalGetMixin, SparseQuerysetMixin, FastListMixin, FragmentCacheMixin, ModelViewSet):
     serializer_class = FoodSerializer
     permission_classes = [AllowAny]  # Allow anyone to view foods
-
-    def get_queryset(self):
+    pagination_class = FoodCursorPagination
+    filter_backends = [FoodFilter]
+    sparse_actions = ('list', 'retrieve', 'search')
+    # Public reads served from the MenuEntry read table (see foodapp.menu);
+    # retrieve, search and related read Food
+    menu_entry_actions = ('list', 'facets')
+    cache_control = {'max_age': 0, 'must_revalidate': True}
+
+    def get_restaurant_user(self):
+        """Return the request user if they are restaurant staff, else None"""
         user = self.request.user
-        
-        # If user is authenticated and is restaurant staff, show only their foods
         if user.is_authenticated:
             try:
-                profile = user.profile
-                if profile.role == 'restaurant':
-                    # Restaurant staff see only their own foods
-                    return Food.objects.filter(restaurant=user).order_by('-id')
+                if user.profile.role == 'restaurant':
+                    return user
             except Profile.DoesNotExist:
                 pass
-        
+        return None
+
+    def get_queryset(self):
+        # Restaurant staff see only their own foods
+        restaurant_user = self.get_restaurant_user()
+        if restaurant_user is not None:
+            return Food.objects.filter(restaurant=restaurant_user).order_by('-id')
+
         # Unauthenticated users (customers) see only available foods
+        if self.action in self.menu_entry_actions:
+            return MenuEntry.objects.order_by('-food_id')
         return Food.objects.filter(available=True).order_by('-id')
 
+    def get_serializer_class(self):
+        if self.action in self.menu_entry_actions and self.get_restaurant_user() is None:
+            return MenuEntrySerializer
+        return super().get_serializer_class()
+
+    def get_menu_etag(self, restaurant_id, *parts):
+        """ETag for a menu read, valid until the menu version changes"""
+        request = self.request
+        return make_etag(
+            self.action,
+            restaurant_id or 'public',
+            get_menu_version(restaurant_id),
+            request.get_host(),
+            request.accepted_media_type,
+            sorted(request.query_params.lists()),
+            *parts
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        Serve the rendered menu from cache. Keys carry the menu version,
+        which Food save/delete signals bump, so edits show up immediately.
+        """
+        restaurant_user = self.get_restaurant_user()
+        restaurant_id = restaurant_user.id if restaurant_user else None
+
+        not_modified = self.not_modified(request, self.get_menu_etag(restaurant_id))
+        if not_modified:
+            return not_modified
+
+        audience = 'restaurant' if restaurant_id is not None else 'public'
+        key = menu_cache_key(audience, restaurant_id, request)
+
+        data = get_cached_menu(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            set_cached_menu(key, data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        restaurant_user = self.get_restaurant_user()
+        restaurant_id = restaurant_user.id if restaurant_user else None
+
+        etag = self.get_menu_etag(restaurant_id, kwargs.get('pk'))
+        not_modified = self.not_modified(request, etag)
+        if not_modified:
+            return not_modified
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search over dish names and descriptions: ?q=
+        """
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {'error': 'Search query (q) is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        restaurant_user = self.get_restaurant_user()
+        restaurant_id = restaurant_user.id if restaurant_user else None
+        not_modified = self.not_modified(request, self.get_menu_etag(restaurant_id))
+        if not_modified:
+            return not_modified
+
+        queryset = search_foods(self.filter_queryset(self.get_queryset()), query)
+        queryset = queryset.order_by('-rank', '-id')
+
+        paginator = FoodSearchPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], authentication_classes=[])
+    def suggest(self, request):
+        """
+        Dish name autocomplete: ?prefix=ch&limit=8. Answered from this
+        worker's in-memory prefix index of the public menu, without touching
+        the database (see foodapp.suggest).
+        """
+        prefix = request.query_params.get('prefix', '').strip()
+        if not prefix:
+            return Response(
+                {'error': 'prefix is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(parse_int('limit', request.query_params.get('limit', 8)), SUGGEST_LIMIT))
+        return Response(suggest(prefix, limit))
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Per-category counts, in-stock counts and price buckets for the
+        menu, cached per menu version.
+        """
+        restaurant_user = self.get_restaurant_user()
+        restaurant_id = restaurant_user.id if restaurant_user else None
+
+        not_modified = self.not_modified(request, self.get_menu_etag(restaurant_id))
+        if not_modified:
+            return not_modified
+
+        audience = 'restaurant' if restaurant_id is not None else 'public'
+        key = menu_cache_key(audience, restaurant_id, request, kind='facets')
+        data = get_cached_menu(key)
+        if data is None:
+            data = menu_facets(self.filter_queryset(self.get_queryset()))
+            set_cached_menu(key, data)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        """
+        Best-selling dishes over the last few days: ?window=7d (1d-90d),
+        ?limit=10 (max 50). Read from the sales rollup and cached until the
+        menu or the rollup changes.
+        """
+        window = request.query_params.get('window', '7d')
+        days = window[:-1] if window.endswith('d') else window
+        if not days.isdigit() or not 1 <= int(days) <= 90:
+            return Response(
+                {'error': 'window must be between 1d and 90d'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = max(1, min(parse_int('limit', request.query_params.get('limit', 10)), 50))
+
+        restaurant_user = self.get_restaurant_user()
+        restaurant_id = restaurant_user.id if restaurant_user else None
+        # The window moves at midnight even if nothing else changed
+        validators = (get_sales_version(), timezone.localdate())
+
+        not_modified = self.not_modified(request, self.get_menu_etag(restaurant_id, *validators))
+        if not_modified:
+            return not_modified
+
+        audience = 'restaurant' if restaurant_id is not None else 'public'
+        kind = 'popular:%s:%s' % validators
+        key = menu_cache_key(audience, restaurant_id, request, kind=kind)
+        data = get_cached_menu(key)
+        if data is None:
+            rows = popular_foods(self.filter_queryset(self.get_queryset()), int(days), limit)
+            serializer = self.get_serializer([food for food, _, _ in rows], many=True)
+            data = [
+                dict(item, quantity_sold=quantity, revenue=str(revenue))
+                for item, (_, quantity, revenue) in zip(serializer.data, rows)
+            ]
+            set_cached_menu(key, data)
+        return Response(data)
+
+    @action(detail=True, methods=['get'])
+    def related(self, request, pk=None):
+        """
+        Dishes most often ordered together with this one, read from the
+        precomputed top-k table (see foodapp.recommendations).
+        """
+        restaurant_user = self.get_restaurant_user()
+        restaurant_id = restaurant_user.id if restaurant_user else None
+        # 404 for malformed ids and for dishes the caller can't see
+        food = self.get_object()
+
+        etag = self.get_menu_etag(restaurant_id, food.pk, get_related_version())
+        not_modified = self.not_modified(request, etag)
+        if not_modified:
+            return not_modified
+
+        rows = list(
+            RelatedFood.objects
+            .filter(food_id=food.pk, related__in=self.get_queryset())
+            .select_related('related')
+            .order_by('rank')
+        )
+        serializer = self.get_serializer([row.related for row in rows], many=True)
+        data = [
+            dict(item, together_count=row.together_count)
+            for item, row in zip(serializer.data, rows)
+        ]
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Delta sync for clients holding a copy of the menu: ?since=<cursor>.
+        Returns rows changed since the cursor, ids that were removed from
+        the caller's menu, and the cursor to send next time.
+        """
+        restaurant_user = self.get_restaurant_user()
+        if restaurant_user is not None:
+            queryset = Food.all_objects.filter(restaurant=restaurant_user)
+        else:
+            queryset = Food.all_objects.all()
+
+        rows, cursor, has_more = changes_since(queryset, request.query_params.get('since'))
+
+        changed, removed = [], []
+        for food in rows:
+            if food.deleted_at is not None or (restaurant_user is None and not food.available):
+                removed.append(food.id)
+            else:
+                changed.append(food)
+
+        serializer = self.get_serializer(changed, many=True)
+        return Response({
+            'changed': serializer.data,
+            'removed': removed,
+            'cursor': cursor,
+            'has_more': has_more,
+        })
+
     def perform_create(self, serializer):
         """
         this location restaurent insert picture
         come from request.FILES
         """
-        serializer.save(restaurant=self.request.user)
+        # One transaction with the MenuEntry refresh in post_save
+        with transaction.atomic():
+            serializer.save(restaurant=self.request.user)
 
     def perform_update(self, serializer):
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
-    def upload_image(self, request, pk=None):
+    def perform_destroy(self, instance):
+        # Keep a tombstone so syncing clients can drop the item
+        with transaction.atomic():
+            instance.soft_delete()
+
+    @action(detail=False, methods=['get', 'post'], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
         """
-        RESTAURANT can upload/update food image
+        Restaurant menu import/export in one call.
+        POST a CSV (text/csv, header row) or NDJSON (application/x-ndjson)
+        body; rows with an id update that dish, others create one.
+        GET streams the menu back: ?as=csv (default) or ?as=ndjson.
         """
-        food = self.get_object()
-        
-        # Check if user is the restaurant owner
+        restaurant_user = self.get_restaurant_user()
+        if restaurant_user is None:
+            return Response(
+                {'error': 'Only restaurant staff can import or export menus'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        if request.method == 'GET':
+            kind = request.query_params.get('as', 'csv')
+            if kind == 'csv':
+                response = StreamingHttpResponse(export_csv(restaurant_user), content_type='text/csv')
+            elif kind == 'ndjson':
+                response = StreamingHttpResponse(
+                    export_ndjson(restaurant_user), content_type='application/x-ndjson'
+                )
+            else:
+                return Response(
+                    {'error': 'as must be csv or ndjson'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            response['Content-Disposition'] = f'attachment; filename="menu.{kind}"'
+            return response
+
+        try:
+            result = import_menu(restaurant_user, request.stream, request.content_type)
+        except BulkFormatError:
+            return Response(
+                {'error': 'Send text/csv or application/x-ndjson'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        except (UnicodeDecodeError, csv.Error) as exc:
+            return Response(
+                {'error': f'Could not read the upload: {exc}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(result)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def bulk_update(self, request):
+        """
+        Change price, stock and/or availability of many dishes at once:
+        [{"id": 3, "available": false}, {"id": 7, "price": "4500", "stock": 12}]
+        All-or-nothing; applied in one UPDATE statement.
+        """
+        restaurant_user = self.get_restaurant_user()
+        if restaurant_user is None:
+            return Response(
+                {'error': 'Only restaurant staff can update menus'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        serializer = FoodBulkUpdateSerializer(
+            data=request.data, many=True, allow_empty=False, max_length=BULK_UPDATE_LIMIT
+        )
+        serializer.is_valid(raise_exception=True)
+        updates = serializer.validated_data
+
+        ids = [update['id'] for update in updates]
+        if len(set(ids)) != len(ids):
+            return Response(
+                {'error': 'Each dish may appear only once'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        missing = update_foods(restaurant_user, updates)
+        if missing:
+            return Response(
+                {'error': 'Dishes not found on your menu', 'ids': missing},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'updated': len(ids)})
+
+    def image_owner_error(self, request, food):
+        """A 403 response unless the user is this food's restaurant"""
         user = request.user
         try:
             profile = user.profile
@@ -145,38 +482,199 @@ class FoodViewSet(ModelViewSet):
                 {'error': 'User profile not found'},
                 status=status.HTTP_403_FORBIDDEN
             )
-        
+
         if food.restaurant and food.restaurant != user:
             return Response(
                 {'error': 'You can only update your own food items'},
                 status=status.HTTP_403_FORBIDDEN
             )
-        
-        if 'image' not in request.FILES:
+        return None
+
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def upload_image(self, request, pk=None):
+        """
+        RESTAURANT can upload/update food image
+        """
+        food = self.get_object()
+        error = self.image_owner_error(request, food)
+        if error is not None:
+            return error
+
+        # Refuse oversized bodies before reading them
+        if body_too_large(request):
             return Response(
-                {'error': 'No image file provided'},
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': 'Image is too large'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
             )
-        
-        try:
-            food.image = request.FILES['image']
-            food.save()
-            serializer = FoodSerializer(food, context={'request': request})
-            return Response({
-                'message': 'Image uploaded successfully',
-                'food': serializer.data
-            }, status=status.HTTP_200_OK)
-        except Exception as e:
+
+        # Stream the photo to the staging directory instead of memory
+        handler = ImageUploadHandler(food.pk, request=request._request)
+        request._request.upload_handlers = [handler]
+        upload = request.FILES.get('image')
+        if handler.error:
+            return Response({'error': handler.error.message}, status=handler.error.status)
+        if upload is None:
             return Response(
-                {'error': f'Image upload failed: {str(e)}'},
+                {'error': 'No image file provided'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        # Decoding, resizing and variants happen off the request
+        schedule_upload(upload.staged_path)
+        serializer = FoodSerializer(food, context={'request': request})
+        return Response({
+            'message': 'Image received; it will appear once processed',
+            'food': serializer.data
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+    # Resumable uploads (see foodapp.uploads.ResumableUpload)
+    def upload_state(self, upload, offset=None):
+        offset = upload.offset if offset is None else offset
+        response = Response({
+            'upload_id': upload.id,
+            'offset': offset,
+            'size': upload.size,
+            'chunk_size': max_chunk_bytes(),
+        })
+        response['Upload-Offset'] = str(offset)
+        response['Upload-Length'] = str(upload.size)
+        return response
+
+    def get_resumable_upload(self, request, food, upload_id):
+        upload = ResumableUpload.load(upload_id)
+        if upload is None or upload.food_id != food.pk or upload.user_id != request.user.pk:
+            return None
+        return upload
+
+    @action(detail=True, methods=['post'], url_path='uploads', permission_classes=[IsAuthenticated])
+    def start_upload(self, request, pk=None):
+        """
+        Begin a resumable image upload: {"size": <bytes>, "filename": ...}.
+        Chunks then go to PUT uploads/<upload_id>/ with an Upload-Offset
+        header, and POST uploads/<upload_id>/finalize/ hands the image over.
+        """
+        food = self.get_object()
+        error = self.image_owner_error(request, food)
+        if error is not None:
+            return error
+
+        size = parse_int('size', request.data.get('size'))
+        if size <= 0:
+            return Response({'error': 'size must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = ResumableUpload.start(food.pk, request.user.pk, size, str(request.data.get('filename', '')))
+        except UploadRejected as exc:
+            return Response({'error': exc.message}, status=exc.status)
+
+        response = self.upload_state(upload, offset=0)
+        response.status_code = status.HTTP_201_CREATED
+        response['Location'] = request.build_absolute_uri(f'{request.path}{upload.id}/')
+        return response
+
+    @action(
+        detail=True, methods=['get', 'put', 'delete'], url_path=r'uploads/(?P<upload_id>[0-9a-f]{32})',
+        permission_classes=[IsAuthenticated]
+    )
+    def resumable_upload(self, request, pk=None, upload_id=None):
+        """
+        GET/HEAD: how much has arrived. PUT: append the body at the
+        Upload-Offset header. DELETE: abandon the upload.
+        """
+        food = self.get_object()
+        upload = self.get_resumable_upload(request, food, upload_id)
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        if request.method == 'DELETE':
+            upload.abort()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.method != 'PUT':
+            return self.upload_state(upload)
+
+        offset = parse_int('Upload-Offset', request.META.get('HTTP_UPLOAD_OFFSET'))
+        length = request.META.get('CONTENT_LENGTH')
+        if not length:
+            return Response({'error': 'Content-Length is required'}, status=status.HTTP_411_LENGTH_REQUIRED)
+        try:
+            new_offset = upload.append(request.stream, offset, parse_int('Content-Length', length))
+        except UploadConflict as exc:
+            return Response({'error': exc.message, 'offset': exc.offset}, status=exc.status)
+        except UploadRejected as exc:
+            return Response({'error': exc.message}, status=exc.status)
+        return self.upload_state(upload, offset=new_offset)
+
+    @action(
+        detail=True, methods=['post'], url_path=r'uploads/(?P<upload_id>[0-9a-f]{32})/finalize',
+        permission_classes=[IsAuthenticated]
+    )
+    def finalize_upload(self, request, pk=None, upload_id=None):
+        """
+        Finish a resumable upload (optionally checking {"sha256": ...}) and
+        queue it exactly like a single-request upload.
+        """
+        food = self.get_object()
+        upload = self.get_resumable_upload(request, food, upload_id)
+        if upload is None:
+            return Response({'error': 'Upload not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            path = upload.finalize(sha256=request.data.get('sha256'))
+        except UploadConflict as exc:
+            return Response({'error': exc.message, 'offset': exc.offset}, status=exc.status)
+        except UploadRejected as exc:
+            return Response({'error': exc.message}, status=exc.status)
+
+        schedule_upload(path)
+        serializer = FoodSerializer(food, context={'request': request})
+        return Response({
+            'message': 'Image received; it will appear once processed',
+            'food': serializer.data
+        }, status=status.HTTP_202_ACCEPTED)
+
+    # Direct uploads (see foodapp.uploads.start_direct_upload)
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def direct_upload(self, request, pk=None):
+        """
+        Presigned form POST for sending an image straight to storage. Send
+        every returned field plus Content-Type and `file` to `url`, then
+        report the key to direct_upload/complete/.
+        """
+        food = self.get_object()
+        error = self.image_owner_error(request, food)
+        if error is not None:
+            return error
+
+        upload = start_direct_upload(food.pk)
+        upload['url'] = request.build_absolute_uri(upload['url'])
+        return Response(upload, status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=True, methods=['post'], url_path='direct_upload/complete',
+        permission_classes=[IsAuthenticated]
+    )
+    def complete_direct_upload(self, request, pk=None):
+        food = self.get_object()
+        error = self.image_owner_error(request, food)
+        if error is not None:
+            return error
+
+        key = request.data.get('key')
+        try:
+            check_direct_upload_key(food.pk, key)
+        except UploadRejected as exc:
+            return Response({'error': exc.message}, status=exc.status)
+
+        schedule_ingest(food.pk, key)
+        serializer = FoodSerializer(food, context={'request': request})
+        return Response({
+            'message': 'Image received; it will appear once processed',
+            'food': serializer.data
+        }, status=status.HTTP_202_ACCEPTED)
 
 # ============================
 # ORDER VIEWSET
 # ============================
-class OrderViewSet(ModelViewSet):
+class OrderViewSet(SparseQuerysetMixin, FastListMixin, FragmentCacheMixin, ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
 
@@ -207,6 +705,13 @@ class OrderViewSet(ModelViewSet):
             return OrderCreateSerializer
         return OrderSerializer
 
+    def get_fragment_row_dependencies(self, pks):
+        # Orders render their customer's name and their items' food names
+        # and prices: an order goes stale with those rows, not with every
+        # menu or account edit
+        rows = Order.objects.filter(pk__in=pks).values_list('pk', 'customer_id', 'orderitem__food_id')
+        return related_versions(rows, User, Food)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -217,18 +722,19 @@ class OrderViewSet(ModelViewSet):
             # Get all restaurant staff users
             restaurant_users = User.objects.filter(profile__role='restaurant')
             
-            # Create notification for each restaurant staff
-            for staff in restaurant_users:
-                Notification.objects.create(
-                    user=staff,
-                    order=order,
-                    type='new_order',
-                    message=f'New order #{order.id} received from {order.customer.username} - Tzs{order.total_price}'
-                )
+            # One notification per restaurant staff, in a single insert
+            message = f'New order #{order.id} received from {order.customer.username} - Tzs{order.total_price}'
+            Notification.objects.bulk_create(
+                Notification(user=staff, order=order, type='new_order', message=message)
+                for staff in restaurant_users
+            )
         except Exception as e:
             print(f"Warning: Failed to create notifications for staff: {str(e)}")
         
         # Return the created order with full details
+        prefetch_related_objects(
+            [order], Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('food'))
+        )
         order_serializer = OrderSerializer(order, context={'request': request})
         return Response(order_serializer.data, status=201)
 
@@ -371,12 +877,16 @@ class OrderViewSet(ModelViewSet):
             orders = orders.filter(status=status_filter)
             print(f"After status filter ({status_filter}): {orders.count()}")
         
-        serializer = OrderSerializer(orders, many=True, context={'request': request})
+        orders = OrderSerializer.optimize_queryset(orders, request)
+        data = render_with_fragments(
+            OrderSerializer, orders, {'request': request}, self.get_fragment_dependencies(),
+            self.get_fragment_row_dependencies,
+        )
         response_data = {
-            'total': orders.count(),
-            'orders': serializer.data
+            'total': len(data),
+            'orders': data
         }
-        print(f"Returning {len(serializer.data)} orders")
+        print(f"Returning {len(data)} orders")
         print(f"=== END DEBUG ===\n")
         return Response(response_data)
 
@@ -434,7 +944,7 @@ class InventoryViewSet(ModelViewSet):
 # ======================
 # NOTIFICATION VIEWSET
 # ======================
-class NotificationViewSet(ModelViewSet):
+class NotificationViewSet(SparseQuerysetMixin, ModelViewSet):
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
     
@@ -466,14 +976,26 @@ class NotificationViewSet(ModelViewSet):
 # ============================
 # PROFILE VIEWS
 # ============================
-class ProfileView(APIView):
+class ProfileView(ConditionalGetMixin, APIView):
     permission_classes = [IsAuthenticated]
+    cache_control = {'private': True, 'no_cache': True}
 
     def get(self, request):
         """Get current user's profile"""
+        etag = make_etag(
+            'profile',
+            request.user.id,
+            get_profile_version(request.user.id),
+            request.accepted_media_type,
+            sorted(request.query_params.lists()),
+        )
+        not_modified = self.not_modified(request, etag)
+        if not_modified:
+            return not_modified
+
         try:
             profile = request.user.profile
-            serializer = ProfileSerializer(profile)
+            serializer = ProfileSerializer(profile, context={'request': request})
             return Response(serializer.data)
         except Profile.DoesNotExist:
             return Response(